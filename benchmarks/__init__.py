@@ -0,0 +1 @@
+"""Offline benchmarks. Run them from the repository root, e.g. ``python -m benchmarks.pipeline``."""
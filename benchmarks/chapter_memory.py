@@ -0,0 +1,101 @@
+"""Measure the memory :meth:`.MangaDex.check_updates` uses for a backlog of chapters.
+
+The backlog is published on a local fake server and fetched through the global chapter feed,
+as after downtime. Run it from the repository root::
+
+    python -m benchmarks.chapter_memory --chapters 5000 --entries 2000
+
+The fake server runs in a child process, so :mod:`tracemalloc` only sees the client side.
+"""
+import argparse
+import asyncio
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from multiprocessing import Pipe, Process
+from multiprocessing.connection import Connection
+from random import Random
+from time import perf_counter
+from typing import Dict, List
+
+from aiohttp import ClientSession
+from hondana import Client
+
+from src.delivery import DeliveryScheduler
+from src.models import MangaEntry
+from src.sources.mangadex import MangaDex
+
+from .fakes import Catalog, FakeSourceServer, route_mangadex
+from .filter_chapter_entry import make_entries
+from .pipeline import BenchmarkBot
+
+
+def serve(seed: int, chapters: int, connection: Connection):
+    """Serve a backlog of chapters until the parent process sends anything."""
+
+    async def serve_backlog():
+        server = FakeSourceServer(Catalog(seed=seed))
+        server.publish(chapters, 0)
+        await server.start()
+        connection.send(server.url)
+        await asyncio.get_running_loop().run_in_executor(None, connection.recv)
+        await server.stop()
+
+    asyncio.run(serve_backlog())
+
+
+async def run(args: argparse.Namespace, url: str):
+    rng = Random(args.seed)
+    # The same seed gives the same catalog as the server's.
+    catalog = Catalog(seed=args.seed)
+    entries = make_entries(rng, catalog, args.entries)
+    entries.append(MangaEntry(id=0, item_id="*:*", source_id=MangaDex.__name__))
+    data: Dict[str, List[MangaEntry]] = defaultdict(list)
+    for entry in entries:
+        data[entry.item_id].append(entry)
+    route_mangadex(url)
+    bot = BenchmarkBot(DeliveryScheduler())
+    bot.session = ClientSession()
+    bot.hondana = Client(session=bot.session)
+    source: MangaDex = bot.source_map[MangaDex.__name__]
+    for entry in entries:
+        source.compile(entry)  # Cached across checks, so not part of a backlog's cost.
+    last_update = datetime.now(timezone.utc) - timedelta(hours=1)
+    try:
+        tracemalloc.start()
+        start = perf_counter()
+        updates = await source.check_updates(last_update, data)
+        elapsed = perf_counter() - start
+        snapshot = tracemalloc.take_snapshot()
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        await bot.session.close()
+    print(f"{args.chapters} chapters, {len(entries)} entries, {len(updates)} updates")
+    print(f"check_updates: {elapsed:.2f}s")
+    print(f"peak:          {peak / 2**20:.1f} MiB")
+    print(f"retained:      {retained / 2**20:.1f} MiB")
+    print(f"per update:    {retained / max(1, len(updates)):.0f} B")
+    for stat in snapshot.statistics("lineno")[: args.top]:
+        print(f"  {stat}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--chapters", type=int, default=5000)
+    parser.add_argument("--entries", type=int, default=2000)
+    parser.add_argument("--top", type=int, default=5, help="allocation sites to show")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    connection, child_connection = Pipe()
+    server = Process(target=serve, args=(args.seed, args.chapters, child_connection))
+    server.start()
+    try:
+        asyncio.run(run(args, connection.recv()))
+    finally:
+        connection.send(None)
+        server.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,469 @@
+"""Local stand-ins for MangaDex, Guya sites and the parts of Discord the update pipeline uses."""
+from collections import Counter
+from datetime import datetime, timezone
+from itertools import count
+from json import dumps
+from random import Random
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+from aiohttp import web
+from discord import ChannelType
+from hondana.utils import Route
+
+BOT_ID = 1_000_000_000_000_000
+
+
+def uuid(rng: Random) -> str:
+    return str(UUID(int=rng.getrandbits(128), version=4))
+
+
+def mangadex_time(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%dT%H:%M:%S+00:00")
+
+
+def creator_payload(creator_type: str, creator_id: str, name: str) -> Dict[str, Any]:
+    links = dict.fromkeys(
+        (
+            "imageUrl",
+            "twitter",
+            "pixiv",
+            "melonBook",
+            "fanBox",
+            "booth",
+            "nicoVideo",
+            "skeb",
+            "fantia",
+            "tumblr",
+            "youtube",
+            "weibo",
+            "naver",
+            "website",
+        )
+    )
+    return {
+        "id": creator_id,
+        "type": creator_type,
+        "attributes": {
+            "name": name,
+            "biography": {},
+            **links,
+            "version": 1,
+            "createdAt": "2022-01-01T00:00:00+00:00",
+            "updatedAt": "2022-01-01T00:00:00+00:00",
+        },
+    }
+
+
+def tag_payload(tag_id: str, name: str) -> Dict[str, Any]:
+    return {
+        "id": tag_id,
+        "type": "tag",
+        "attributes": {
+            "name": {"en": name},
+            "description": {},
+            "group": "genre",
+            "version": 1,
+        },
+        "relationships": [],
+    }
+
+
+def manga_payload(
+    manga_id: str,
+    title: str,
+    content_rating: str,
+    tags: List[Dict[str, Any]],
+    authors: List[Dict[str, Any]],
+) -> Dict[str, Any]:
+    return {
+        "id": manga_id,
+        "type": "manga",
+        "attributes": {
+            "title": {"en": title},
+            "altTitles": [],
+            "description": {},
+            "isLocked": False,
+            "links": {},
+            "originalLanguage": "ja",
+            "lastVolume": None,
+            "lastChapter": None,
+            "publicationDemographic": None,
+            "status": "ongoing",
+            "year": None,
+            "contentRating": content_rating,
+            "chapterNumbersResetOnNewVolume": False,
+            "availableTranslatedLanguages": ["en"],
+            "latestUploadedChapter": None,
+            "tags": tags,
+            "state": "published",
+            "version": 1,
+            "createdAt": "2022-01-01T00:00:00+00:00",
+            "updatedAt": "2022-01-01T00:00:00+00:00",
+        },
+        "relationships": authors,
+    }
+
+
+def group_payload(group_id: str, name: str) -> Dict[str, Any]:
+    return {
+        "id": group_id,
+        "type": "scanlation_group",
+        "attributes": {
+            "name": name,
+            "altNames": [],
+            "website": None,
+            "ircServer": None,
+            "ircChannel": None,
+            "discord": None,
+            "contactEmail": None,
+            "description": None,
+            "twitter": None,
+            "mangaUpdates": None,
+            "focusedLanguage": ["en"],
+            "locked": False,
+            "official": False,
+            "verified": False,
+            "inactive": False,
+            "exLicensed": False,
+            "publishDelay": None,
+            "version": 1,
+            "createdAt": "2022-01-01T00:00:00+00:00",
+            "updatedAt": "2022-01-01T00:00:00+00:00",
+        },
+    }
+
+
+def user_payload(user_id: str, name: str) -> Dict[str, Any]:
+    return {
+        "id": user_id,
+        "type": "user",
+        "attributes": {"username": name, "roles": [], "version": 1},
+    }
+
+
+def chapter_payload(
+    chapter_id: str,
+    number: int,
+    language: str,
+    created: datetime,
+    manga: Dict[str, Any],
+    groups: List[Dict[str, Any]],
+    uploader: Dict[str, Any],
+    external_url: Optional[str] = None,
+) -> Dict[str, Any]:
+    created_at = mangadex_time(created)
+    return {
+        "id": chapter_id,
+        "type": "chapter",
+        "attributes": {
+            "title": None,
+            "volume": None,
+            "chapter": str(number),
+            "pages": 20,
+            "translatedLanguage": language,
+            "externalUrl": external_url,
+            "isUnavailable": False,
+            "version": 1,
+            "createdAt": created_at,
+            "updatedAt": created_at,
+            "publishAt": created_at,
+            "readableAt": created_at,
+        },
+        "relationships": [manga, *groups, uploader],
+    }
+
+
+class Catalog:
+    """A deterministic pool of MangaDex resources and Guya series to publish chapters from."""
+
+    languages = ["en"] * 8 + ["es", "fr"]
+    content_ratings = ["safe"] * 6 + ["suggestive"] * 3 + ["erotica"]
+
+    def __init__(
+        self,
+        seed: int = 0,
+        mangas: int = 500,
+        groups: int = 100,
+        users: int = 50,
+        tags: int = 40,
+        series: int = 50,
+    ):
+        self.rng = Random(seed)
+        self.tags = [tag_payload(uuid(self.rng), f"Tag {i}") for i in range(tags)]
+        self.authors = [
+            creator_payload("author", uuid(self.rng), f"Author {i}")
+            for i in range(max(1, mangas // 4))
+        ]
+        self.mangas = [
+            manga_payload(
+                uuid(self.rng),
+                f"Manga {i}",
+                self.rng.choice(self.content_ratings),
+                self.rng.sample(self.tags, 3),
+                [self.rng.choice(self.authors)],
+            )
+            for i in range(mangas)
+        ]
+        self.groups = [
+            group_payload(uuid(self.rng), f"Group {i}") for i in range(groups)
+        ]
+        self.users = [user_payload(uuid(self.rng), f"user{i}") for i in range(users)]
+        self.chapter_numbers: Counter = Counter()
+        self.series = {
+            f"series-{i}": {
+                "slug": f"series-{i}",
+                "title": f"Series {i}",
+                "preferred_sort": ["1"],
+                "chapters": {},
+                "last_updated": 0,
+            }
+            for i in range(series)
+        }
+
+    def chapter(self, created: datetime) -> Dict[str, Any]:
+        manga = self.rng.choice(self.mangas)
+        self.chapter_numbers[manga["id"]] += 1
+        groups = [self.rng.choice(self.groups)] if self.rng.random() < 0.9 else []
+        return chapter_payload(
+            uuid(self.rng),
+            self.chapter_numbers[manga["id"]],
+            self.rng.choice(self.languages),
+            created,
+            manga,
+            groups,
+            self.rng.choice(self.users),
+            external_url="https://example.com" if self.rng.random() < 0.05 else None,
+        )
+
+    def series_chapter(self, released: datetime):
+        series = self.series[self.rng.choice(list(self.series))]
+        number = str(len(series["chapters"]) + 1)
+        timestamp = int(released.timestamp())
+        series["chapters"][number] = {
+            "title": "",
+            "folder": f"{number.zfill(4)}",
+            "groups": {"1": ["01.png"]},
+            "release_date": {"1": timestamp},
+        }
+        series["last_updated"] = timestamp
+
+
+def json_response(payload: Any) -> web.Response:
+    # hondana only decodes responses whose content type is exactly application/json.
+    return web.Response(body=dumps(payload).encode(), content_type="application/json")
+
+
+class FakeSourceServer:
+    """Serves the chapter feed of MangaDex and the API of every Guya site from one catalog.
+
+    MangaDex lives at ``/`` and each Guya site at ``/<name>/api``.
+    """
+
+    def __init__(self, catalog: Catalog):
+        self.catalog = catalog
+        self.chapters: List[Dict[str, Any]] = []
+        self.requests: Counter = Counter()
+        self.runner: Optional[web.AppRunner] = None
+        self.url = ""
+
+    def publish(self, chapters: int, series_chapters: int):
+        """Release new MangaDex chapters and Guya series chapters, dated now."""
+        now = datetime.now(timezone.utc)
+        self.chapters.extend(self.catalog.chapter(now) for _ in range(chapters))
+        for _ in range(series_chapters):
+            self.catalog.series_chapter(now)
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/chapter", self.chapter_list)
+        app.router.add_get("/{site}/api/get_all_series", self.all_series)
+        app.router.add_get("/{site}/api/series/{slug}", self.series)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}"
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+    async def chapter_list(self, request: web.Request) -> web.Response:
+        self.requests["mangadex /chapter"] += 1
+        query = request.query
+        since = query.get("createdAtSince")
+        since = mangadex_time(datetime.fromisoformat(since)) if since else ""
+        manga = query.get("manga")
+        groups = set(query.getall("groups[]", ()))
+        uploaders = set(query.getall("uploader[]", ())) | set(
+            query.getall("uploader", ())
+        )
+        languages = set(query.getall("translatedLanguage[]", ()))
+        matches = []
+        for chapter in self.chapters:
+            if chapter["attributes"]["createdAt"] < since:
+                continue
+            if (
+                languages
+                and chapter["attributes"]["translatedLanguage"] not in languages
+            ):
+                continue
+            related = {item["type"]: item["id"] for item in chapter["relationships"]}
+            if manga and related["manga"] != manga:
+                continue
+            if uploaders and related["user"] not in uploaders:
+                continue
+            if groups and related.get("scanlation_group") not in groups:
+                continue
+            matches.append(chapter)
+        limit = int(query.get("limit", 10))
+        offset = int(query.get("offset", 0))
+        return json_response(
+            {
+                "result": "ok",
+                "response": "collection",
+                "data": matches[offset : offset + limit],
+                "limit": limit,
+                "offset": offset,
+                "total": len(matches),
+            }
+        )
+
+    async def all_series(self, request: web.Request) -> web.Response:
+        self.requests[f"{request.match_info['site']} get_all_series"] += 1
+        return json_response(
+            {
+                series["title"]: {
+                    "slug": series["slug"],
+                    "last_updated": series["last_updated"],
+                }
+                for series in self.catalog.series.values()
+            }
+        )
+
+    async def series(self, request: web.Request) -> web.Response:
+        self.requests[f"{request.match_info['site']} series"] += 1
+        series = self.catalog.series.get(request.match_info["slug"])
+        if series is None:
+            raise web.HTTPNotFound()
+        return json_response(series)
+
+
+def route_mangadex(url: str):
+    """Send hondana's MangaDex requests to ``url``.
+
+    The base URL is ``Route.BASE`` in the pinned hondana and ``Route.API_BASE_URL`` in others.
+    """
+    for name in ("BASE", "API_BASE_URL"):
+        if hasattr(Route, name):
+            setattr(Route, name, url)
+            return
+    raise AssertionError("hondana's Route has no base URL to point at the fake server")
+
+
+class FakeDiscord:
+    """Hands out snowflakes and counts the API calls made through the fake objects."""
+
+    def __init__(self):
+        self.calls: Counter = Counter()
+        self.ids = count(BOT_ID + 1)
+
+    def snowflake(self) -> int:
+        return next(self.ids)
+
+
+class FakeMessage:
+    def __init__(self, discord: FakeDiscord, channel: "FakeChannel"):
+        self.discord = discord
+        self.channel = channel
+        self.id = discord.snowflake()
+
+    async def create_thread(self, *, name: str, reason: Optional[str] = None):
+        self.discord.calls["create_thread"] += 1
+        return self.channel.new_thread(name, ChannelType.public_thread)
+
+    async def pin(self):
+        self.discord.calls["pin"] += 1
+
+
+class FakeThread:
+    def __init__(
+        self,
+        discord: FakeDiscord,
+        channel: "FakeChannel",
+        name: str,
+        thread_type: ChannelType,
+    ):
+        self.discord = discord
+        self.parent = channel
+        self.guild = channel.guild
+        self.id = discord.snowflake()
+        self.name = name
+        self.type = thread_type
+        self.owner_id = BOT_ID
+        self.archived = False
+        self.last_message_id: Optional[int] = None
+        self.created_at = datetime.now(timezone.utc)
+
+    async def send(self, content: Optional[str] = None, **kwargs: Any) -> FakeMessage:
+        self.discord.calls["send"] += 1
+        message = FakeMessage(self.discord, self.parent)
+        self.last_message_id = message.id
+        return message
+
+    async def edit(self, *, archived: bool = False, **kwargs: Any):
+        self.discord.calls["edit_thread"] += 1
+        if archived:
+            self.archived = True
+            self.guild.active_threads.pop(self.id, None)
+
+    async def add_user(self, user: Any):
+        self.discord.calls["add_user"] += 1
+
+    def permissions_for(self, member: Any) -> SimpleNamespace:
+        return SimpleNamespace(manage_messages=True)
+
+
+class FakeChannel:
+    def __init__(self, discord: FakeDiscord, guild: "FakeGuild"):
+        self.discord = discord
+        self.guild = guild
+        self.id = discord.snowflake()
+
+    def new_thread(self, name: str, thread_type: ChannelType) -> FakeThread:
+        thread = FakeThread(self.discord, self, name, thread_type)
+        self.guild.active_threads[thread.id] = thread
+        return thread
+
+    async def send(self, content: Optional[str] = None, **kwargs: Any) -> FakeMessage:
+        self.discord.calls["send"] += 1
+        return FakeMessage(self.discord, self)
+
+    async def create_thread(
+        self, *, name: str, type: ChannelType, reason: Optional[str] = None
+    ) -> FakeThread:
+        self.discord.calls["create_thread"] += 1
+        return self.new_thread(name, type)
+
+
+class FakeGuild:
+    unavailable = False
+
+    def __init__(self, discord: FakeDiscord, channels: int):
+        self.id = discord.snowflake()
+        self.me = SimpleNamespace(id=BOT_ID)
+        self.active_threads: Dict[int, FakeThread] = {}
+        self.channels = {
+            channel.id: channel
+            for channel in (FakeChannel(discord, self) for _ in range(channels))
+        }
+
+    @property
+    def threads(self) -> List[FakeThread]:
+        return list(self.active_threads.values())
+
+    def get_channel(self, channel_id: int) -> Optional[FakeChannel]:
+        return self.channels.get(channel_id)
@@ -0,0 +1,292 @@
+"""Benchmark MangaDex chapter matching and check it against :meth:`.MangaDex.filter_chapter_entry`.
+
+Synthetic hondana chapters are matched against synthetic subscriptions whose customizations
+cover every filter, including ``"no group"`` in group lists, the ``"*"`` language and filters
+that only apply to some resource types. Run it from the repository root::
+
+    python -m benchmarks.filter_chapter_entry --entries 10000 --chapters 1000
+
+Pass ``--processes`` to also time matching in a process pool, the way
+:meth:`.MangaDex.check_updates` does past :attr:`.MangaDex.pool_threshold` chapters. Any decision
+that differs from the reference implementation is printed and makes the script exit with
+status 1.
+"""
+
+import argparse
+import pickle
+import sys
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from json import dumps, loads
+from multiprocessing import get_context
+from random import Random
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from hondana import Chapter
+
+from src.models import MangaEntry
+from src.sources.mangadex import (
+    ChapterFacts,
+    CompiledFilter,
+    MangaDex,
+    MangaDexCustomizations,
+    SubscriptionMatcher,
+    _match_chunk,
+)
+from src.utils.general import batch
+
+from .fakes import Catalog
+
+RESOURCE_TYPES = ["manga"] * 12 + ["group"] * 3 + ["user"] * 2 + ["author"] * 2 + ["*"]
+LANGUAGES = [[], ["en"], ["en"], ["en", "es"], ["fr"], ["*"], ["*", "en"]]
+RATINGS = ["safe", "suggestive", "erotica", "pornographic"]
+
+
+def sample(rng: Random, pool: List[str], chance: float, extra: Tuple[str, ...] = ()):
+    if rng.random() >= chance:
+        return []
+    return rng.sample(pool, rng.randint(1, 3)) + [
+        item for item in extra if rng.random() < 0.5
+    ]
+
+
+def make_customizations(
+    rng: Random, catalog: Catalog
+) -> Optional[MangaDexCustomizations]:
+    if rng.random() < 0.05:
+        return None  # Accepts everything.
+    group_ids = [group["id"] for group in catalog.groups]
+    user_ids = [user["id"] for user in catalog.users]
+    tag_ids = [tag["id"] for tag in catalog.tags]
+    manga_ids = [manga["id"] for manga in catalog.mangas]
+    return {
+        "languages": list(rng.choice(LANGUAGES)),
+        "whitelisted_groups": sample(rng, group_ids, 0.2, ("no group",)),
+        "blacklisted_groups": sample(rng, group_ids, 0.2, ("no group",)),
+        "whitelisted_users": sample(rng, user_ids, 0.1),
+        "blacklisted_users": sample(rng, user_ids, 0.1),
+        "whitelisted_content_ratings": sample(rng, RATINGS, 0.2),
+        "blacklisted_content_ratings": sample(rng, RATINGS, 0.2),
+        "whitelisted_tags": sample(rng, tag_ids, 0.2),
+        "blacklisted_tags": sample(rng, tag_ids, 0.2),
+        "whitelisted_mangas": sample(rng, manga_ids, 0.05),
+        "blacklisted_mangas": sample(rng, manga_ids, 0.05),
+        "external_links": rng.random() < 0.3,
+    }
+
+
+def make_entries(rng: Random, catalog: Catalog, count: int) -> List[MangaEntry]:
+    pools = {
+        "manga": [manga["id"] for manga in catalog.mangas],
+        "group": [group["id"] for group in catalog.groups],
+        "user": [user["id"] for user in catalog.users],
+        "author": [author["id"] for author in catalog.authors],
+    }
+    entries = []
+    for entry_id in range(1, count + 1):
+        resource_type = rng.choice(RESOURCE_TYPES)
+        if resource_type == "*":
+            item_id = "*:*"
+        elif rng.random() < 0.02:
+            item_id = f"{resource_type}:*"
+        else:
+            item_id = f"{resource_type}:{rng.choice(pools[resource_type])}"
+        entries.append(
+            MangaEntry(
+                id=entry_id,
+                item_id=item_id,
+                source_id=MangaDex.__name__,
+                extra_config=make_customizations(rng, catalog),
+            )
+        )
+    return entries
+
+
+def make_chapters(catalog: Catalog, count: int) -> List[Chapter]:
+    now = datetime.now(timezone.utc)
+    payloads = [catalog.chapter(now) for _ in range(count)]
+    # Chapter pops keys out of its payload, so each one gets a fresh copy like a real response.
+    return [Chapter(None, loads(dumps(payload))) for payload in payloads]
+
+
+def subscription_key(item_id: str) -> str:
+    resource_type, sep, resource_id = item_id.partition(":")
+    return "*" if resource_id == "*" else item_id
+
+
+def timed(label: str, work: int, unit: str, function: Callable[[], object]):
+    start = perf_counter()
+    result = function()
+    elapsed = perf_counter() - start
+    print(f"{label:<34} {elapsed:8.3f}s {work / elapsed:14,.0f} {unit}/s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--entries", type=int, default=10000)
+    parser.add_argument("--chapters", type=int, default=1000)
+    parser.add_argument(
+        "--pairs",
+        type=int,
+        default=200000,
+        help="random (chapter, entry) pairs to check one by one, 0 for all of them",
+    )
+    parser.add_argument(
+        "--processes", type=int, default=0, help="worker processes, 0 to skip the pool"
+    )
+    parser.add_argument("--chunk-size", type=int, default=MangaDex.pool_chunk_size)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = Random(args.seed)
+    catalog = Catalog(seed=args.seed)
+    entries = make_entries(rng, catalog, args.entries)
+    chapters = make_chapters(catalog, args.chapters)
+    source = MangaDex(None)
+    by_key: Dict[str, List[MangaEntry]] = defaultdict(list)
+    for entry in entries:
+        by_key[subscription_key(entry.item_id)].append(entry)
+    print(f"{len(entries)} entries under {len(by_key)} keys, {len(chapters)} chapters")
+
+    facts = timed(
+        "extract ChapterFacts",
+        len(chapters),
+        "chapters",
+        lambda: [ChapterFacts.from_chapter(chapter) for chapter in chapters],
+    )
+    compiled = timed(
+        "compile filters",
+        len(entries),
+        "entries",
+        lambda: {entry.id: CompiledFilter(entry) for entry in entries},
+    )
+    matcher = timed(
+        "build SubscriptionMatcher",
+        len(entries),
+        "entries",
+        lambda: SubscriptionMatcher(
+            {
+                key: [compiled[entry.id] for entry in value]
+                for key, value in by_key.items()
+            }
+        ),
+    )
+
+    def reference_matches() -> List[Set[int]]:
+        return [
+            {
+                entry.id
+                for key in chapter_facts.resource_keys()
+                for entry in by_key.get(key, ())
+                if source.filter_chapter_entry(chapter, entry)
+            }
+            for chapter, chapter_facts in zip(chapters, facts)
+        ]
+
+    subscribed_pairs = sum(
+        len(by_key.get(key, ())) for item in facts for key in item.resource_keys()
+    )
+    expected = timed(
+        "filter_chapter_entry (subscribed)",
+        subscribed_pairs,
+        "pairs",
+        reference_matches,
+    )
+    actual = timed(
+        "SubscriptionMatcher.match",
+        subscribed_pairs,
+        "pairs",
+        lambda: [
+            {match.entry_id for match in matcher.match(chapter_facts)}
+            for chapter_facts in facts
+        ],
+    )
+
+    pooled = None
+    if args.processes:
+        with ProcessPoolExecutor(
+            args.processes, mp_context=get_context("spawn")
+        ) as pool:
+            # Start the workers first so their imports are not timed.
+            list(pool.map(abs, range(args.processes)))
+
+            def match_in_pool() -> List[Set[int]]:
+                data = pickle.dumps(matcher)
+                chunks = [
+                    pool.submit(_match_chunk, 1, data, chunk)
+                    for chunk in batch(facts, args.chunk_size)
+                ]
+                by_chapter: Dict[str, Set[int]] = defaultdict(set)
+                for future in chunks:
+                    for entry_id, chapter_id in future.result():
+                        by_chapter[chapter_id].add(entry_id)
+                return [by_chapter[chapter.id] for chapter in chapters]
+
+            pooled = timed(
+                f"process pool ({args.processes} workers)",
+                subscribed_pairs,
+                "pairs",
+                match_in_pool,
+            )
+
+    if args.pairs:
+        pairs = [
+            (rng.randrange(len(chapters)), rng.randrange(len(entries)))
+            for _ in range(args.pairs)
+        ]
+    else:
+        pairs = [(i, j) for i in range(len(chapters)) for j in range(len(entries))]
+    reference = timed(
+        "filter_chapter_entry (any pair)",
+        len(pairs),
+        "pairs",
+        lambda: [
+            source.filter_chapter_entry(chapters[i], entries[j]) for i, j in pairs
+        ],
+    )
+    fast = timed(
+        "CompiledFilter.matches (any pair)",
+        len(pairs),
+        "pairs",
+        lambda: [compiled[entries[j].id].matches(facts[i]) for i, j in pairs],
+    )
+
+    mismatches = 0
+    for chapter, wanted, got in zip(chapters, expected, actual):
+        if wanted != got:
+            mismatches += 1
+            if mismatches <= 5:
+                print(
+                    f"SubscriptionMatcher differs for chapter {chapter.id}: "
+                    f"missing {sorted(wanted - got)}, extra {sorted(got - wanted)}"
+                )
+    for chapter, wanted, got in zip(chapters, expected, pooled or ()):
+        if wanted != got:
+            mismatches += 1
+            if mismatches <= 5:
+                print(
+                    f"Process pool differs for chapter {chapter.id}: "
+                    f"missing {sorted(wanted - got)}, extra {sorted(got - wanted)}"
+                )
+    for (i, j), wanted, got in zip(pairs, reference, fast):
+        if wanted != got:
+            mismatches += 1
+            if mismatches <= 10:
+                entry = entries[j]
+                print(
+                    f"CompiledFilter differs for chapter {chapters[i].id} and entry "
+                    f"{entry.item_id} {dumps(entry.extra_config)}: expected {wanted}"
+                )
+    accepted = sum(map(len, expected))
+    print(f"{accepted} of {subscribed_pairs} subscribed pairs accepted")
+    if mismatches:
+        print(f"{mismatches} mismatches")
+        sys.exit(1)
+    print("No mismatches")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""Benchmark the update pipeline without touching MangaDex, Guya or Discord.
+
+Every tick publishes new chapters on a local fake server, polls every subscribed source through
+:meth:`.UpdatePoller.poll_source` and drains the outbox into fake guilds. Run it from the
+repository root::
+
+    python -m benchmarks.pipeline --subscriptions 2000 --chapters 300 --guilds 50 --ticks 20
+
+The database defaults to in-memory SQLite; pass ``--db`` a scratch Postgres URL to measure
+against Postgres instead. Its tables are created if they do not exist.
+"""
+import argparse
+import asyncio
+import logging
+from copy import deepcopy
+from datetime import datetime, timedelta, timezone
+from random import Random
+from time import perf_counter
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Sequence
+
+from aiohttp import ClientSession
+from discord import ChannelType
+from hondana import Client
+from tortoise import Tortoise
+
+from src.activity import ActivityTracker
+from src.cogs.update_check import UpdateChecker
+from src.config_manager import ConfigManager
+from src.delivery import DeliveryScheduler
+from src.metrics import Metrics
+from src.models import MangaEntry, Ping
+from src.sources import make_source_map
+from src.sources.guya import Guya
+from src.sources.mangadex import MangaDex
+from src.subscriptions import SubscriptionIndex
+from src.thread_index import ThreadIndex
+from src.tracing import Tracer
+from src.utils.http import HostLimiter, ResponseCache
+
+from .fakes import (
+    BOT_ID,
+    Catalog,
+    FakeDiscord,
+    FakeGuild,
+    FakeSourceServer,
+    route_mangadex,
+)
+
+
+class QueryCounter(logging.Handler):
+    """Counts the queries tortoise logs, whichever backend it uses."""
+
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.queries = 0
+
+    def emit(self, record: logging.LogRecord):
+        if not record.getMessage().startswith(
+            ("Created connection", "Closed connection")
+        ):
+            self.queries += 1
+
+
+class BenchmarkBot:
+    """The subset of :class:`.MangaReleaseBot` used by the update pipeline."""
+
+    def __init__(self, delivery: DeliveryScheduler):
+        self.user = SimpleNamespace(id=BOT_ID)
+        self.config_manager: Optional[ConfigManager] = None
+        self.session: Optional[ClientSession] = None
+        self.hondana: Optional[Client] = None
+        self.host_limiter = HostLimiter()
+        self.http_cache = ResponseCache()
+        self.subscriptions = SubscriptionIndex()
+        self.delivery = delivery
+        self.item_activity = ActivityTracker()
+        # Every item is due on every tick, so ticks are comparable.
+        self.item_activity.max_staleness = timedelta(0)
+        self.threads = ThreadIndex(self)
+        self.metrics = Metrics()
+        self.tracer = Tracer()
+        self.guilds: Dict[int, FakeGuild] = {}
+        self.poll_sources = True
+        self.partitioned = False
+        self.source_map = make_source_map(self)
+
+    def shard_of(self, guild_id: int) -> int:
+        return 0
+
+    def get_guild(self, guild_id: int) -> Optional[FakeGuild]:
+        return self.guilds.get(guild_id)
+
+    async def wait_until_ready(self):
+        pass
+
+
+def percentile(values: Sequence[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def background_drains() -> List[asyncio.Task]:
+    return [
+        task
+        for task in asyncio.all_tasks()
+        if task.get_coro().__qualname__
+        == UpdateChecker.deliver_pending_updates.__qualname__
+    ]
+
+
+async def seed(
+    args: argparse.Namespace, catalog: Catalog, guilds: List[FakeGuild]
+) -> None:
+    rng = Random(args.seed)
+    entries = []
+    for i in range(args.subscriptions):
+        guild = guilds[i % len(guilds)]
+        channel_id = rng.choice(list(guild.channels))
+        if i < args.wildcards:
+            source_id, item_id = MangaDex.__name__, "*:*"
+        elif rng.random() < args.guya_share:
+            source_id, item_id = Guya.__name__, rng.choice(list(catalog.series))
+        elif rng.random() < args.group_share:
+            source_id = MangaDex.__name__
+            item_id = f"group:{rng.choice(catalog.groups)['id']}"
+        else:
+            source_id = MangaDex.__name__
+            item_id = f"manga:{rng.choice(catalog.mangas)['id']}"
+        entries.append(
+            MangaEntry(
+                guild_id=guild.id,
+                channel_id=channel_id,
+                creator_id=BOT_ID,
+                item_id=item_id,
+                source_id=source_id,
+                extra_config=(
+                    deepcopy(MangaDex.default_customizations)
+                    if source_id == MangaDex.__name__
+                    else None
+                ),
+            )
+        )
+    await MangaEntry.bulk_create(entries, batch_size=1000)
+    pings = []
+    for entry in await MangaEntry.all():
+        for j in range(args.pings):
+            pings.append(Ping(item_id=entry.id, mention_id=BOT_ID + j, is_role=j % 2))
+    await Ping.bulk_create(pings, batch_size=1000)
+
+
+async def run(args: argparse.Namespace):
+    await Tortoise.init(db_url=args.db, modules={"models": ["src.models"]})
+    await Tortoise.generate_schemas(safe=True)
+    queries = QueryCounter()
+    db_logger = logging.getLogger("tortoise.db_client")
+    db_logger.setLevel(logging.DEBUG)
+    db_logger.addHandler(queries)
+    db_logger.propagate = False
+
+    catalog = Catalog(seed=args.seed, mangas=args.mangas, series=args.series)
+    server = FakeSourceServer(catalog)
+    await server.start()
+    route_mangadex(server.url)
+    if args.paced:
+        delivery = DeliveryScheduler()
+    else:
+        delivery = DeliveryScheduler(global_rate=10**9, guild_rate=10**9)
+    bot = BenchmarkBot(delivery)
+    discord = FakeDiscord()
+    guilds = [FakeGuild(discord, args.channels) for _ in range(args.guilds)]
+    bot.guilds = {guild.id: guild for guild in guilds}
+    for guild in guilds:
+        channel = next(iter(guild.channels.values()))
+        for _ in range(args.existing_threads):
+            channel.new_thread("Old thread", ChannelType.public_thread)
+        bot.threads.load_guild(guild)
+    for source_id, source in bot.source_map.items():
+        if isinstance(source, Guya):
+            source.base_endpoint = f"{server.url}/{source_id}/api"
+    await seed(args, catalog, guilds)
+
+    bot.session = ClientSession()
+    bot.hondana = Client(session=bot.session)
+    bot.config_manager = await ConfigManager.get()
+    bot.config_manager.last_updated = int(datetime.now(timezone.utc).timestamp()) - 1
+    await bot.subscriptions.load()
+    checker = UpdateChecker(bot)
+
+    durations = []
+    setup_queries = queries.queries
+    start = perf_counter()
+    try:
+        for _ in range(args.ticks):
+            server.publish(args.chapters, args.series_chapters)
+            tick_start = perf_counter()
+            for source_id, source in bot.source_map.items():
+                await checker.poller.poll_source(source_id, source)
+            await checker.deliver_pending_updates()
+            # poll_source starts drains of its own; they find nothing left but still count.
+            await asyncio.gather(*background_drains())
+            durations.append(perf_counter() - tick_start)
+    finally:
+        elapsed = perf_counter() - start
+        for source in bot.source_map.values():
+            source.close()
+        await bot.session.close()
+        await server.stop()
+        await Tortoise.close_connections()
+
+    print(
+        f"{args.subscriptions} subscriptions in {args.guilds} guilds, "
+        f"{args.chapters} MangaDex and {args.series_chapters} Guya chapters per tick"
+    )
+    print(f"ticks:         {len(durations)} in {elapsed:.2f}s")
+    print(f"ticks/s:       {len(durations) / elapsed:.2f}")
+    print(f"tick p50:      {percentile(durations, 0.5) * 1000:.1f}ms")
+    print(f"tick p99:      {percentile(durations, 0.99) * 1000:.1f}ms")
+    print(f"threads:       {delivery.delivered}")
+    print(f"DB queries:    {queries.queries - setup_queries}")
+    for route, calls in sorted(server.requests.items()):
+        print(f"source API:    {calls} x {route}")
+    for method, calls in sorted(discord.calls.items()):
+        print(f"Discord API:   {calls} x {method}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--subscriptions", type=int, default=1000)
+    parser.add_argument("--wildcards", type=int, default=0, help="*:* subscriptions")
+    parser.add_argument("--guya-share", type=float, default=0.2)
+    parser.add_argument("--group-share", type=float, default=0.1)
+    parser.add_argument("--pings", type=int, default=2, help="pings per subscription")
+    parser.add_argument("--guilds", type=int, default=20)
+    parser.add_argument("--channels", type=int, default=2, help="channels per guild")
+    parser.add_argument("--existing-threads", type=int, default=0)
+    parser.add_argument("--mangas", type=int, default=500)
+    parser.add_argument("--series", type=int, default=50)
+    parser.add_argument("--chapters", type=int, default=200, help="per tick")
+    parser.add_argument("--series-chapters", type=int, default=5, help="per tick")
+    parser.add_argument("--ticks", type=int, default=10)
+    parser.add_argument("--paced", action="store_true", help="use real rate budgets")
+    parser.add_argument("--db", default="sqlite://:memory:")
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
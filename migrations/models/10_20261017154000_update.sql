@@ -0,0 +1,14 @@
+-- upgrade --
+CREATE TABLE IF NOT EXISTS "itemactivity" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "source_id" VARCHAR(20) NOT NULL,
+    "item_id" VARCHAR(1024) NOT NULL,
+    "created" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "last_checked" TIMESTAMPTZ,
+    "last_release" TIMESTAMPTZ,
+    "release_interval" DOUBLE PRECISION,
+    CONSTRAINT "uid_itemactivit_source__d6a53b" UNIQUE ("source_id", "item_id")
+);
+COMMENT ON TABLE "itemactivity" IS 'When an item of a source was last checked and how often it releases chapters.';
+-- downgrade --
+DROP TABLE IF EXISTS "itemactivity";
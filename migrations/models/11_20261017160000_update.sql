@@ -0,0 +1,7 @@
+-- upgrade --
+ALTER TABLE "pendingupdate" ADD "shard" INT NOT NULL  DEFAULT 0;
+CREATE INDEX "idx_pendingupda_shard_9dc4bc" ON "pendingupdate" ("shard");
+COMMENT ON COLUMN "pendingupdate"."shard" IS 'The shard of the entry''s guild, so each process only drains its own guilds.';
+-- downgrade --
+DROP INDEX "idx_pendingupda_shard_9dc4bc";
+ALTER TABLE "pendingupdate" DROP COLUMN "shard";
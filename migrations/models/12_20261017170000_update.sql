@@ -0,0 +1,5 @@
+-- upgrade --
+ALTER TABLE "pendingupdate" ADD "retry_at" TIMESTAMPTZ;
+COMMENT ON COLUMN "pendingupdate"."retry_at" IS 'Failed and postponed updates are not delivered again before this time.';
+-- downgrade --
+ALTER TABLE "pendingupdate" DROP COLUMN "retry_at";
@@ -0,0 +1,18 @@
+-- upgrade --
+CREATE TABLE IF NOT EXISTS "pendingupdate" (
+    "id" SERIAL NOT NULL PRIMARY KEY,
+    "chapter_id" VARCHAR(256) NOT NULL,
+    "thread_title" VARCHAR(100) NOT NULL,
+    "message" TEXT,
+    "embed" JSONB,
+    "created" TIMESTAMPTZ NOT NULL  DEFAULT CURRENT_TIMESTAMP,
+    "delivered" TIMESTAMPTZ,
+    "attempts" INT NOT NULL  DEFAULT 0,
+    "entry_id" INT NOT NULL REFERENCES "mangaentry" ("id") ON DELETE CASCADE,
+    CONSTRAINT "uid_pendingupda_entry_i_8dddbd" UNIQUE ("entry_id", "chapter_id")
+);
+CREATE INDEX IF NOT EXISTS "idx_pendingupda_deliver_5b621c" ON "pendingupdate" ("delivered");
+CREATE INDEX IF NOT EXISTS "idx_pendingupda_entry_i_0bf2f6" ON "pendingupdate" ("entry_id");
+COMMENT ON TABLE "pendingupdate" IS 'An update that was found by a source but may not have been delivered yet.';
+-- downgrade --
+DROP TABLE IF EXISTS "pendingupdate";
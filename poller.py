@@ -0,0 +1,4 @@
+from src.poller import main
+
+if __name__ == "__main__":
+    main()
@@ -21,12 +21,8 @@ def patch(key: str):
     def patched(function: Callable[..., _T]):
         @wraps(function)
         def wrapper(*args: Any, **kwargs: Any) -> _T:
-            if bot is None:
-                pass
-            else:
-                setattr(
-                    bot.config_manager, key, getattr(bot.config_manager, key, 0) + 1
-                )
+            if bot is not None:
+                bot.metrics.inc(key)
             return function(*args, **kwargs)
 
         return wrapper
@@ -0,0 +1,132 @@
+"""Adaptive polling of items based on how often they release chapters."""
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Mapping, Optional, Set, Tuple, TypeVar
+
+from .models import ItemActivity
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class ActivityTracker:
+    """Track observed releases per ``(source_id, item_id)`` and decide which items are due.
+
+    An item is polled roughly every quarter of its expected release interval: the moving
+    average of the time between observed releases, or the time since it was first seen if it
+    has not released anything yet. The interval is never shorter than the source's own poll
+    interval and never longer than :attr:`max_staleness`.
+    """
+
+    #: The longest an item can go without being checked.
+    max_staleness = timedelta(hours=6)
+    #: How much a new release interval counts towards the moving average.
+    smoothing = 0.5
+
+    def __init__(self):
+        self.items: Dict[Tuple[str, str], ItemActivity] = {}
+        self.changed: Set[Tuple[str, str]] = set()
+
+    async def load(self):
+        for item in await ItemActivity.all():
+            self.items[item.source_id, item.item_id] = item
+
+    def get(self, source_id: str, item_id: str, now: datetime) -> ItemActivity:
+        key = (source_id, item_id)
+        if key not in self.items:
+            self.items[key] = ItemActivity(
+                source_id=source_id, item_id=item_id, created=now
+            )
+        return self.items[key]
+
+    def poll_interval(
+        self, item: ItemActivity, now: datetime, base_interval: timedelta
+    ) -> timedelta:
+        if item.release_interval is not None:
+            expected = timedelta(seconds=item.release_interval)
+        else:
+            expected = now - (item.last_release or item.created)
+        return min(max(expected / 4, base_interval), self.max_staleness)
+
+    def split_due(
+        self,
+        source_id: str,
+        data: Mapping[str, T],
+        now: datetime,
+        base_interval: timedelta,
+        adaptive: Iterable[str],
+    ) -> Tuple[Dict[str, T], Optional[datetime]]:
+        """Pick the items of a source that should be checked now.
+
+        :param adaptive: The item IDs that can be polled adaptively. Every other item is
+            always due.
+        :return: The due items, and the earliest time any due adaptive item was last checked
+            (``None`` if no due item was checked before), which is how far back the check
+            has to look.
+        """
+        adaptive = set(adaptive)
+        due = {}
+        since = None
+        for item_id, value in data.items():
+            if item_id not in adaptive:
+                due[item_id] = value
+                continue
+            item = self.get(source_id, item_id, now)
+            if (
+                item.last_checked is None
+                or now - item.last_checked
+                >= self.poll_interval(item, now, base_interval)
+            ):
+                due[item_id] = value
+                if item.last_checked is not None and (
+                    since is None or item.last_checked < since
+                ):
+                    since = item.last_checked
+        logger.debug("%s of %s %s items are due", len(due), len(data), source_id)
+        return due, since
+
+    def earliest_check(
+        self, source_id: str, item_ids: Iterable[str]
+    ) -> Optional[datetime]:
+        """Get when the item checked longest ago was last checked, or None if none were."""
+        checked = [
+            item.last_checked
+            for item in (self.items.get((source_id, item_id)) for item_id in item_ids)
+            if item is not None and item.last_checked is not None
+        ]
+        return min(checked, default=None)
+
+    def record(
+        self,
+        source_id: str,
+        checked: Iterable[str],
+        released: Iterable[str],
+        now: datetime,
+    ):
+        """Record that items were checked at ``now``, and which of them released chapters."""
+        for item_id in checked:
+            self.get(source_id, item_id, now).last_checked = now
+            self.changed.add((source_id, item_id))
+        for item_id in set(released):
+            item = self.get(source_id, item_id, now)
+            if item.last_release is not None:
+                interval = (now - item.last_release).total_seconds()
+                if item.release_interval is None:
+                    item.release_interval = interval
+                else:
+                    item.release_interval += self.smoothing * (
+                        interval - item.release_interval
+                    )
+            item.last_release = now
+            self.changed.add((source_id, item_id))
+
+    async def save(self):
+        if not self.changed:
+            return
+        await ItemActivity.bulk_create(
+            [self.items[key] for key in self.changed],
+            on_conflict=["source_id", "item_id"],
+            update_fields=["last_checked", "last_release", "release_interval"],
+        )
+        self.changed.clear()
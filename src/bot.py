@@ -1,4 +1,5 @@
 import logging
+from os import getenv
 from typing import Optional
 
 from aiohttp import ClientSession
@@ -8,7 +9,7 @@ from discord.app_commands import (
     CommandInvokeError as AppCommandInvokeError,
 )
 from discord.ext.commands import (
-    Bot,
+    AutoShardedBot,
     CommandError,
     CommandInvokeError as ExtCommandInvokeError,
     CommandNotFound,
@@ -18,24 +19,62 @@ from discord.ext.commands import (
 from hondana import Client
 
 from ._patched import discord as patched_discord
+from .activity import ActivityTracker
 from .config import bot_token, mangadex_password, mangadex_username
 from .config_manager import ConfigManager
+from .delivery import DeliveryScheduler
 from .errors.exceptions import BaseError
+from .fanout import OutboxChannel
+from .metrics import Metrics
 from .orm import init
 from .sources import make_source_map
+from .subscriptions import SubscriptionIndex
+from .thread_index import ThreadIndex
+from .tracing import Tracer
+from .utils.http import HostLimiter, ResponseCache
 
 
 logger = logging.getLogger(__name__)
 
 
-class MangaReleaseBot(Bot):
+class MangaReleaseBot(AutoShardedBot):
+    """The bot. Every process runs the shards of ``SHARD_IDS`` (comma-separated) out of
+    ``SHARD_COUNT``, or all shards if these are unset.
+
+    When running several processes, set ``POLL_SOURCES=0`` on all but one of them. The
+    polling process notifies the others of new updates, and each process delivers the updates
+    for its own shards. Polling can also be moved out of the bot entirely by running
+    ``poller.py`` (see :mod:`src.poller`) and setting ``POLL_SOURCES=0`` on every bot process.
+    """
+
     def __init__(self):
         self.config_manager: Optional[ConfigManager] = None
         self.session: Optional[ClientSession] = None
         self.hondana: Optional[Client] = None
+        self.host_limiter = HostLimiter()
+        self.http_cache = ResponseCache(path=getenv("HTTP_CACHE_FILE"))
+        self.subscriptions = SubscriptionIndex()
+        self.delivery = DeliveryScheduler()
+        self.item_activity = ActivityTracker()
+        self.threads = ThreadIndex(self)
+        self.metrics = Metrics()
+        self.tracer = Tracer(enabled=bool(getenv("TRACING")))
+        self.poll_sources = getenv("POLL_SOURCES", "1") == "1"
+        self.outbox_channel = OutboxChannel()
         intents = Intents.default()
         intents.members = True
-        super().__init__(when_mentioned, intents=intents)
+        shard_ids = getenv("SHARD_IDS")
+        shard_count = getenv("SHARD_COUNT")
+        super().__init__(
+            when_mentioned,
+            intents=intents,
+            shard_ids=(
+                [int(shard_id) for shard_id in shard_ids.split(",")]
+                if shard_ids
+                else None
+            ),
+            shard_count=int(shard_count) if shard_count else None,
+        )
         self.source_map = make_source_map(self)
         patched_discord.bot = self  # Singleton
 
@@ -58,8 +97,13 @@ class MangaReleaseBot(Bot):
 
     async def setup_hook(self) -> None:
         await init()
-        self.config_manager = await ConfigManager.get()
+        self.config_manager = await ConfigManager.get(write_behind=True)
+        for source in self.source_map.values():
+            await source.upgrade_configs()
+        await self.subscriptions.load()
+        await self.item_activity.load()
         self.session = ClientSession()
+        self.http_cache.load()
         self.hondana = Client(
             session=self.session, username=mangadex_username, password=mangadex_password
         )
@@ -67,9 +111,25 @@ class MangaReleaseBot(Bot):
         await self.load_extension("..cogs.manga", package=__name__)
         await self.load_extension("..cogs.update_check", package=__name__)
         await self.load_extension("..cogs.utils", package=__name__)
+        await self.load_extension("..cogs.metrics", package=__name__)
+
+    @property
+    def partitioned(self) -> bool:
+        """Whether other processes run the rest of the shards."""
+        return self.shard_ids is not None
+
+    def shard_of(self, guild_id: int) -> int:
+        return (guild_id >> 22) % (self.shard_count or 1)
 
     async def close(self) -> None:
+        if self.config_manager.flush_task:
+            self.config_manager.flush_task.cancel()
+        await self.metrics.persist(self.config_manager)
         await self.config_manager.save()
+        for source in self.source_map.values():
+            source.close()
+        self.http_cache.save()
+        await self.outbox_channel.close()
         await self.session.close()
         return await super().close()
 
@@ -1,3 +1,4 @@
+from copy import deepcopy
 from datetime import datetime, timezone
 from json import JSONDecodeError, loads
 from typing import Optional, TYPE_CHECKING, Union
@@ -179,9 +180,11 @@ class Manga(
             manga_entry = await get_manga_entry(
                 id, check_permissions_interaction=interaction
             )
-            await interaction.client.source_map[manga_entry.source_id].validate(
-                manga_entry, json_data
-            )
+            source = interaction.client.source_map[manga_entry.source_id]
+            await source.validate(manga_entry, json_data)
+            if json_data is None or json_data == {}:
+                # Like an empty customization modal, this resets the entry to the defaults.
+                json_data = deepcopy(source.default_customizations)
             await save_config(manga_entry, json_data, interaction)
 
     async def subscribe_user(
@@ -221,6 +224,7 @@ class Manga(
                     f"As the first non-role person to reactivate this manga entry, "
                     f"you have been promoted to the creator of the entry."
                 )
+        await interaction.client.subscriptions.refresh(item_id)
 
     async def unsubscribe_user(
             self, interaction: Interaction, item_id: int, target: Union[User, Role]
@@ -258,6 +262,7 @@ class Manga(
                 f"Deactivated item {item_id} for update checking. To reactivate, at least one other user or role must "
                 f"be subscribed to pings."
             )
+        await interaction.client.subscriptions.refresh(item_id)
 
     async def pause_entry(self, interaction: Interaction, item_id: int):
         manga_entry = await get_manga_entry(item_id, interaction)
@@ -265,6 +270,7 @@ class Manga(
             return await interaction.followup.send("This entry is already paused.")
         manga_entry.paused = datetime.now(tz=timezone.utc)
         await manga_entry.save()
+        await interaction.client.subscriptions.refresh(item_id)
         await interaction.followup.send(f"Paused entry {item_id}.")
 
     async def unpause_entry(self, interaction: Interaction, item_id: int):
@@ -273,6 +279,7 @@ class Manga(
             return await interaction.followup.send("This entry is not paused.")
         manga_entry.paused = None
         await manga_entry.save()
+        await interaction.client.subscriptions.refresh(item_id)
         await interaction.followup.send(f"Unpaused entry {item_id}.")
 
     async def customize_entry(self, interaction: Interaction, item_id: int):
@@ -0,0 +1,81 @@
+import logging
+from io import BytesIO
+from json import dumps
+from os import getenv
+from typing import Literal, Optional, TYPE_CHECKING
+
+from aiohttp import web
+from discord import File
+from discord.ext.commands import Cog, Context, command, is_owner
+from discord.ext.tasks import loop
+
+if TYPE_CHECKING:
+    from ..bot import MangaReleaseBot
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsCog(Cog, name="Metrics"):
+    """Persists counters to the database and exposes the bot's metrics.
+
+    Set ``METRICS_PORT`` to serve them in the Prometheus text format on
+    ``http://127.0.0.1:<port>/metrics``.
+    """
+
+    def __init__(self, bot: "MangaReleaseBot"):
+        self.bot = bot
+        self.runner: Optional[web.AppRunner] = None
+
+    async def cog_load(self):
+        self.persist_metrics.start()
+        port = getenv("METRICS_PORT")
+        if port:
+            app = web.Application()
+            app.router.add_get("/metrics", self.serve_metrics)
+            self.runner = web.AppRunner(app)
+            await self.runner.setup()
+            await web.TCPSite(self.runner, "127.0.0.1", int(port)).start()
+            logger.info("Serving metrics on port %s", port)
+
+    async def cog_unload(self):
+        self.persist_metrics.cancel()
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+    @loop(minutes=5, reconnect=False)
+    async def persist_metrics(self):
+        await self.bot.metrics.persist(self.bot.config_manager)
+
+    async def serve_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.bot.metrics.render_prometheus())
+
+    @command()
+    @is_owner()
+    async def metrics(self, ctx: Context):
+        """Show the bot's counters and timings since it started."""
+        lines = self.bot.metrics.summary() or ["No metrics recorded yet."]
+        await ctx.send("```\n" + "\n".join(lines)[:1900] + "\n```")
+
+    @command()
+    @is_owner()
+    async def trace(
+        self,
+        ctx: Context,
+        action: Literal["on", "off", "dump"] = "dump",
+        limit: Optional[int] = None,
+    ):
+        """Turn tracing on or off, or dump the most recent traces as JSON."""
+        if action != "dump":
+            self.bot.tracer.enabled = action == "on"
+            return await ctx.send(f"Tracing turned {action}.")
+        traces = self.bot.tracer.dump(limit)
+        if not traces:
+            return await ctx.send("No traces recorded. Turn tracing on first.")
+        buffer = BytesIO(dumps(traces, indent=2).encode())
+        await ctx.send(
+            f"{len(traces)} traces.", file=File(buffer, filename="traces.json")
+        )
+
+
+async def setup(bot: "MangaReleaseBot"):
+    await bot.add_cog(MetricsCog(bot))
@@ -1,94 +1,205 @@
 import logging
-from asyncio import (
-    CancelledError,
-    Lock,
-    TimeoutError,
-    create_task,
-    gather,
-    shield,
-    wait_for,
-)
+from asyncio import Lock, create_task, gather
 from collections import defaultdict
-from datetime import datetime
-from typing import Dict, List, Sequence, TYPE_CHECKING
+from dataclasses import replace
+from datetime import datetime, timedelta
+from itertools import chain
+from os import getenv
+from time import monotonic
+from typing import Awaitable, Callable, Dict, List, Tuple, TYPE_CHECKING
 from zoneinfo import ZoneInfo
 
-from discord import ChannelType, Object, TextChannel, Thread
+from discord import (
+    ChannelType,
+    Embed,
+    Guild,
+    Object,
+    RawThreadDeleteEvent,
+    TextChannel,
+    Thread,
+)
 from discord.ext.commands import Cog, Context, command, is_owner
 from discord.ext.tasks import loop
+from tortoise.expressions import F, Q
+from tortoise.queryset import QuerySet
 
-from ..models import MangaEntry, ThreadData
-from ..sources import BaseSource
+from ..models import MangaEntry, PendingUpdate, Ping, ThreadData
+from ..polling import UpdatePoller
 from ..sources.base import UpdateEntry
+from ..utils.general import batch
 from ..views.thread_actions import ThreadActions
 
 if TYPE_CHECKING:
     from ..bot import MangaReleaseBot
 
 UTC = ZoneInfo("UTC")
+MAX_MENTION_LENGTH = len("<@&>") + 20  # Snowflakes have at most 20 digits.
 logger = logging.getLogger(__name__)
 
 
-class UpdateChecker(Cog):
-    def last_updated(self, source: str) -> datetime:
-        return datetime.fromtimestamp(
-            getattr(
-                self.bot.config_manager,
-                f"last_updated_{source}",
-                self.bot.config_manager.last_updated,
-            ),
-            tz=UTC,
+class BotPoller(UpdatePoller):
+    """Polls inside the bot process, skipping channels it cannot see and delivering right away."""
+
+    def __init__(self, checker: "UpdateChecker"):
+        partitioned = checker.bot.partitioned
+        super().__init__(
+            checker.bot,
+            notify=partitioned,
+            # Other processes change subscriptions this process's index does not see.
+            subscription_max_age=float(getenv("SUBSCRIPTION_REFRESH", "60"))
+            if partitioned
+            else None,
         )
+        self.checker = checker
+
+    def visible(self, guild_id: int, channel_id: int) -> bool:
+        guild = self.bot.get_guild(guild_id)
+        if guild is None:
+            # The processes running the other shards check their own guilds when draining.
+            return (
+                self.bot.partitioned
+                and self.bot.shard_of(guild_id) not in self.bot.shard_ids
+            )
+        return guild.get_channel(channel_id) is not None
+
+    def polled(self):
+        if not self.checker.drain_lock.locked():
+            create_task(self.checker.deliver_pending_updates())
+
+
+class UpdateChecker(Cog):
+    outbox_batch_size = 500
+    max_delivery_attempts = 5
+    retry_delay = timedelta(minutes=5)
+    #: How long postponed outbox rows are kept trying, e.g. for a guild that never returns.
+    max_postponement = timedelta(days=1)
+    #: How long delivered outbox rows are kept. Polls only find a chapter again while it is
+    #: inside their window, which is never wider than a few hours.
+    outbox_retention = timedelta(days=1)
 
     def __init__(self, bot: "MangaReleaseBot"):
         self.bot = bot
         self.locks = defaultdict(Lock)
+        self.drain_lock = Lock()
+        #: How many times outbox rows were postponed, to tell whether a batch made progress.
+        self.postponed = 0
+        self.poller = BotPoller(self)
 
     async def cog_load(self):
-        self.bot.config_manager.last_updated = getattr(
-            self.bot.config_manager, "last_updated", 1650600000
-        )
-        self.update_check.start()
+        if self.bot.poll_sources:
+            self.poller.start()
+        if self.bot.partitioned or not self.bot.poll_sources:
+            # Updates are queued by another process.
+            await self.bot.outbox_channel.listen(self.outbox_notified)
+        self.reconcile_subscriptions.start()
+        self.drain_outbox.start()
 
     async def cog_unload(self):
-        self.update_check.cancel()
+        self.poller.scheduler.cancel()
+        self.reconcile_subscriptions.cancel()
+        self.drain_outbox.cancel()
 
-    async def make_entry(self, entry: UpdateEntry):
+    async def make_entry(
+        self, entry: UpdateEntry, created: Callable[[], Awaitable[None]]
+    ):
+        """Make the thread for an update, calling ``created`` as soon as the thread exists.
+
+        Only failures before that are worth retrying, since a retry makes another thread. The
+        message, pings and thread actions are sent on a best-effort basis after it.
+        """
         manga_entry = entry.entry
-        channel: TextChannel = self.bot.get_guild(manga_entry.guild_id).get_channel(
-            manga_entry.channel_id
-        )
-        if manga_entry.message_channel_first:
-            msg = await channel.send(content=entry.message, embed=entry.embed)
-            thread = await msg.create_thread(
-                name=entry.thread_title, reason="Making thread for update."
+        guild = self.bot.get_guild(manga_entry.guild_id)
+        channel: TextChannel = guild.get_channel(manga_entry.channel_id)
+        async with self.bot.delivery.delivery(guild.id):
+            await self.bot.delivery.spend(guild.id, 2)
+            if manga_entry.message_channel_first:
+                msg = await channel.send(content=entry.message, embed=entry.embed)
+                thread = await msg.create_thread(
+                    name=entry.thread_title, reason="Making thread for update."
+                )
+            else:
+                thread = await channel.create_thread(
+                    name=entry.thread_title,
+                    reason="Making thread for update.",
+                    type=ChannelType.public_thread,
+                )
+            self.bot.threads.add(thread)
+            self.bot.metrics.inc("threads_created")
+            await created()
+            if not manga_entry.message_channel_first:
+                await self.best_effort(
+                    thread, thread.send(content=entry.message, embed=entry.embed)
+                )
+            thread_data = ThreadData(thread_id=thread.id, entry=manga_entry)
+            # Pings are prefetched by the subscription index.
+            pings = {}
+            for item in (manga_entry, *entry.merged):
+                async for ping in item.pings:
+                    pings.setdefault((ping.mention_id, ping.is_role), ping)
+            pings = list(pings.values())
+            if getattr(self.bot.config_manager, "batched_pings", True):
+                ping_tasks = [self.add_pings(thread, pings)]
+            else:
+                ping_tasks = [self.add_ping(thread, ping) for ping in pings]
+            await self.best_effort(
+                thread,
+                *ping_tasks,
+                *[
+                    self.send_thread_actions(thread, item)
+                    for item in (manga_entry, *entry.merged)
+                ],
+                thread_data.save(),
             )
+
+    @staticmethod
+    async def best_effort(thread: Thread, *steps: Awaitable[object]):
+        """Run the steps of filling in a thread, logging the ones that fail."""
+        for result in await gather(*steps, return_exceptions=True):
+            if isinstance(result, Exception):
+                logger.error("Error filling in thread %s: %s", thread.id, result)
+
+    async def add_ping(self, thread: Thread, ping: Ping):
+        await self.bot.delivery.spend(thread.guild.id)
+        if ping.is_role:
+            await thread.send(f"Adding role: <@&{ping.mention_id}>")
         else:
-            thread = await channel.create_thread(
-                name=entry.thread_title,
-                reason="Making thread for update.",
-                type=ChannelType.public_thread,
-            )
-            await thread.send(content=entry.message, embed=entry.embed)
-        pings = await manga_entry.pings.all()
+            await thread.add_user(Object(ping.mention_id))
+
+    async def add_pings(self, thread: Thread, pings: List[Ping]):
+        """Mention every ping in as few messages as possible.
+
+        Users are added with :meth:`Thread.add_user` instead in private threads, where a
+        mention does not reach them.
+        """
+        mentions = []
+        user_adds = []
         for ping in pings:
             if ping.is_role:
-                await thread.send(f"Adding role: <@&{ping.mention_id}>")
+                mentions.append(f"<@&{ping.mention_id}>")
+            elif thread.type == ChannelType.private_thread:
+                user_adds.append(ping)
             else:
-                await thread.add_user(Object(ping.mention_id))
+                mentions.append(f"<@{ping.mention_id}>")
+        prefix = "Adding subscribers: "
+        per_message = (2000 - len(prefix)) // (MAX_MENTION_LENGTH + 1)
+        for mentions_batch in batch(mentions, per_message):
+            await self.bot.delivery.spend(thread.guild.id)
+            await thread.send(prefix + " ".join(mentions_batch))
+        await gather(*[self.add_ping(thread, ping) for ping in user_adds])
+
+    async def send_thread_actions(self, thread: Thread, manga_entry: MangaEntry):
+        await self.bot.delivery.spend(thread.guild.id)
         action_message = await thread.send(
             f"Manga Entry ID: **{manga_entry.id}**\n\n**__Thread Actions__**",
             view=ThreadActions(manga_entry.id),
         )
-        if thread.permissions_for(
-            self.bot.get_guild(manga_entry.guild_id).me
-        ).manage_messages:
+        if thread.permissions_for(thread.guild.me).manage_messages:
+            await self.bot.delivery.spend(thread.guild.id)
             await action_message.pin()
-        thread_data = ThreadData(thread_id=thread.id, entry=manga_entry)
-        await thread_data.save()
 
     async def archive_thread(self, thread: Thread):
         # Precondition: Thread is owned by bot.
+        await self.bot.delivery.spend(thread.guild.id, 2)
         await thread.send(
             "Archiving thread prematurely to make space for more threads."
         )
@@ -98,140 +209,287 @@ class UpdateChecker(Cog):
             reason="Archiving thread to make space for more threads.",
         )
 
+    @staticmethod
+    def merge_updates(updates: List[UpdateEntry]) -> List[UpdateEntry]:
+        """Collapse updates for the same chapter of a source in the same channel into one thread.
+
+        The first update is kept and the other entries are added to its
+        :attr:`~.UpdateEntry.merged` so their pings and thread actions are delivered too. The
+        thread is only recorded as the first entry's, as a thread has one :class:`.ThreadData`.
+        """
+        merged: List[UpdateEntry] = []
+        positions: Dict[Tuple[str, int, str], int] = {}
+        for update in updates:
+            if update.chapter_id is None:
+                merged.append(update)
+                continue
+            # Guya mirrors share chapter ids, so the source is part of the key.
+            key = (update.entry.source_id, update.entry.channel_id, update.chapter_id)
+            position = positions.get(key)
+            if position is None:
+                positions[key] = len(merged)
+                merged.append(update)
+            else:
+                first = merged[position]
+                merged[position] = replace(
+                    first, merged=(*first.merged, update.entry, *update.merged)
+                )
+        return merged
+
     async def process_guild(self, tasks: List[UpdateEntry]):
         # Precondition: len(tasks) > 0
         first = tasks[0]
         guild = self.bot.get_guild(first.entry.guild_id)
         async with self.locks[guild.id]:
-            active_threads = sum(
-                len(channel.threads) for channel in guild.text_channels
-            )
-            if active_threads + len(tasks) > 1000:  # Max 1k threads per guild
-                cleaned_requires = active_threads + len(tasks) - 1000
-                logger.debug(
-                    "Too many threads, attempting to clean up %s threads",
-                    cleaned_requires,
-                )
-                my_threads = []
-                for channel in guild.text_channels:
-                    for thread in channel.threads:
-                        if thread.owner_id == self.bot.user.id:
-                            my_threads.append(thread)
-                my_threads.sort(
-                    key=lambda thread: (thread.last_message_id or 0, thread.created_at)
-                )
-                # If there is no last message, it's probably an old thread, and so we aggressively target these first.
-                # Has to be `or 0` because you cannot compare an int and None.
-                if len(my_threads) < cleaned_requires:
-                    logger.debug(
-                        "Not enough threads to clean up, cleaning %s threads and skipping %s threads.",
-                        len(my_threads),
-                        cleaned_requires - len(my_threads),
-                    )
-                    worked_tasks = tasks[: len(my_threads)]
-                    threads_to_clean = my_threads
-                    await gather(
-                        *[self.archive_thread(thread) for thread in threads_to_clean]
-                    )
-                    await gather(*[self.make_entry(task) for task in worked_tasks])
-                    return
-                else:
+            with self.bot.tracer.span(
+                "process_guild", guild=guild.id, tasks=len(tasks)
+            ):
+                active_threads = len(guild.threads)
+                if active_threads + len(tasks) > 1000:  # Max 1k threads per guild
+                    cleaned_requires = active_threads + len(tasks) - 1000
                     logger.debug(
-                        "Found enough threads to clean up, cleaning up %s threads",
+                        "Too many threads, attempting to clean up %s threads",
                         cleaned_requires,
                     )
-                    threads_to_clean = my_threads[:cleaned_requires]
-                    for thread in threads_to_clean:
-                        await self.archive_thread(thread)
-            await gather(*[self.make_entry(task) for task in tasks])
-
-    async def update_check_source(
-        self, source: BaseSource, data: Dict[str, Sequence[MangaEntry]]
-    ) -> List[UpdateEntry]:
-        last_updated = self.last_updated(source.source_name)
+                    threads_to_clean = self.bot.threads.pop_oldest(
+                        guild.id, cleaned_requires
+                    )
+                    if len(threads_to_clean) < cleaned_requires:
+                        skipped = cleaned_requires - len(threads_to_clean)
+                        logger.debug(
+                            "Not enough threads to clean up, cleaning %s threads and postponing %s threads.",
+                            len(threads_to_clean),
+                            skipped,
+                        )
+                        postponed = tasks[len(tasks) - skipped :]
+                        tasks = tasks[: len(tasks) - skipped]
+                        await gather(
+                            *[
+                                self.postpone(self.outbox_rows(task))
+                                for task in postponed
+                            ]
+                        )
+                    else:
+                        logger.debug(
+                            "Found enough threads to clean up, cleaning up %s threads",
+                            cleaned_requires,
+                        )
+                    with self.bot.tracer.span("evict", threads=len(threads_to_clean)):
+                        await gather(
+                            *[
+                                self.archive_thread(thread)
+                                for thread in threads_to_clean
+                            ]
+                        )
+                await gather(*[self.deliver(task) for task in tasks])
+
+    @loop(hours=1, reconnect=False)
+    async def reconcile_subscriptions(self):
+        """Rebuild the subscription index from the database to catch any drift."""
+        if self.reconcile_subscriptions.current_loop == 0:
+            return  # The index was just loaded in setup_hook.
+        drift = await self.bot.subscriptions.load()
+        if drift:
+            logger.info("Subscription index had drifted by %s entries", drift)
+
+    @staticmethod
+    def outbox_rows(update: UpdateEntry) -> QuerySet[PendingUpdate]:
+        """The outbox rows of an update and the updates merged into it."""
+        return PendingUpdate.filter(
+            entry_id__in=[update.entry.id, *(entry.id for entry in update.merged)],
+            chapter_id=update.chapter_id,
+        )
+
+    async def retry_later(self, pending: QuerySet[PendingUpdate]):
+        """Count a failed delivery attempt for outbox rows and postpone them.
+
+        The rows are given up on after :attr:`max_delivery_attempts`.
+        """
+        await pending.update(attempts=F("attempts") + 1)
+        await pending.filter(
+            delivered=None, attempts__gte=self.max_delivery_attempts
+        ).update(delivered=datetime.now(UTC))
+        await self.postpone(pending)
+
+    async def postpone(self, pending: QuerySet[PendingUpdate]):
+        """Retry outbox rows after :attr:`retry_delay` without counting a failed attempt.
+
+        Rows queued more than :attr:`max_postponement` ago are given up on.
+        """
+        self.postponed += 1
+        now = datetime.now(UTC)
+        await pending.update(retry_at=now + self.retry_delay)
+        await pending.filter(
+            delivered=None, created__lt=now - self.max_postponement
+        ).update(delivered=now)
+
+    async def deliver(self, update: UpdateEntry):
+        """Deliver an update from the outbox and mark it (and the updates merged into it) delivered."""
+        pending = self.outbox_rows(update)
+
+        async def created():
+            await pending.update(delivered=datetime.now(UTC))
+
         try:
-            data = await source.check_updates(last_updated, data)
+            with self.bot.tracer.span(
+                "make_entry", entry=update.entry.id, merged=len(update.merged)
+            ):
+                await self.make_entry(update, created)
         except Exception as e:
-            logger.error(f"Error checking updates for {source.source_name}: {e}")
-            return []
-        else:
-            setattr(
-                self.bot.config_manager,
-                f"last_updated_{source.source_name}",
-                datetime.now(UTC).timestamp(),
+            logger.error(
+                "Error delivering %s for entry %s: %s",
+                update.chapter_id,
+                update.entry.id,
+                e,
             )
-        return data
+            await self.retry_later(pending)
+
+    def outbox_notified(self):
+        """Drain the outbox early because another process queued updates."""
+        if self.bot.is_ready() and not self.drain_lock.locked():
+            create_task(self.deliver_pending_updates())
 
-    @loop(minutes=10, reconnect=False)
-    async def update_check(self):
+    @loop(minutes=1, reconnect=False)
+    async def drain_outbox(self):
         await self.bot.wait_until_ready()
-        logger.debug("Starting update check (last checked at %s)", self.bot.config_manager.last_updated)
-        cur_time = datetime.now(UTC)
-        first_filter_round = (
-            await MangaEntry.all()
-            .distinct()
-            .filter(deleted=None, paused=None)
-            .values_list("guild_id", "channel_id")
-        )
-        ids_to_check = []
-        for guild_id, channel_id in first_filter_round:
-            guild = self.bot.get_guild(guild_id)
-            if guild:
-                channel = guild.get_channel(channel_id)
-                if channel:
-                    ids_to_check.append(channel_id)
-        second_filter_round: List[str] = (
-            await MangaEntry.all()
-            .distinct()
-            .filter(deleted=None, paused=None)
-            .values_list("source_id", flat=True)
+        if not self.drain_lock.locked():
+            await self.deliver_pending_updates()
+        await self.prune_outbox()
+
+    async def prune_outbox(self):
+        """Delete outbox rows that were delivered longer than :attr:`outbox_retention` ago."""
+        delivered = PendingUpdate.filter(
+            delivered__lt=datetime.now(UTC) - self.outbox_retention
         )
-        tasks = []
-        for source_id in second_filter_round:
-            source: BaseSource = self.bot.source_map.get(source_id, None)
-            if source:
-                items = await MangaEntry.filter(
-                    source_id=source_id,
-                    channel_id__in=ids_to_check,
-                    deleted=None,
-                    paused=None,
-                ).all()
-                by_item_id = defaultdict(list)
-                for item in items:
-                    by_item_id[item.item_id].append(item)
-                logger.debug("Providing %s to %s", items, type(source).__name__)
-                tasks.append(create_task(self.update_check_source(source, by_item_id)))
-            else:
-                logger.debug("No source object found for %s", source_id)
-        entries: List[List[UpdateEntry]] = await gather(*tasks)  # type: ignore
-        logger.debug("Got entries: %s", entries)
-        entry_tasks: dict[str, list[UpdateEntry]] = defaultdict(list)
-        for top_layer in entries:
-            for entry in top_layer:
-                logger.debug("Found entry: %s", entry)
-                entry_tasks[entry.entry.guild_id].append(entry)
-        try:
-            await wait_for(
-                shield(
-                    gather(
-                        *[
-                            create_task(self.process_guild(item))
-                            for item in entry_tasks.values()
-                        ]
+        if self.bot.partitioned:
+            delivered = delivered.filter(shard__in=self.bot.shard_ids)
+        deleted = await delivered.delete()
+        if deleted:
+            logger.debug("Pruned %s delivered updates from the outbox", deleted)
+
+    async def deliver_pending_updates(self):
+        """Deliver undelivered updates from the outbox until no more progress is made."""
+        pending = PendingUpdate.filter(delivered=None)
+        if self.bot.partitioned:
+            pending = pending.filter(shard__in=self.bot.shard_ids)
+        async with self.drain_lock:
+            with self.bot.tracer.span("deliver_outbox", root=True) as span:
+                while True:
+                    rows = (
+                        await pending.filter(
+                            Q(retry_at=None) | Q(retry_at__lte=datetime.now(UTC))
+                        )
+                        .order_by("id")
+                        .limit(self.outbox_batch_size)
                     )
-                ),
-                60 * 9,
-            )
-        except (CancelledError, TimeoutError):
-            logger.debug("Stopped waiting for the update check.")
-        self.bot.config_manager.last_updated = int(cur_time.timestamp())
-        await self.bot.config_manager.save()
+                    if not rows:
+                        return
+                    span.add("rows", len(rows))
+                    updates = []
+                    dropped = []
+                    unavailable = []
+                    for row in rows:
+                        entry = self.bot.subscriptions.get(row.entry_id)
+                        if entry is None:
+                            dropped.append(row.id)
+                            continue
+                        guild = self.bot.get_guild(entry.guild_id)
+                        if guild is None or guild.unavailable:
+                            # The guild may only be missing until Discord or the shard recovers.
+                            unavailable.append(row.id)
+                            continue
+                        if not guild.get_channel(entry.channel_id):
+                            dropped.append(row.id)
+                            continue
+                        updates.append(
+                            UpdateEntry(
+                                entry,
+                                row.thread_title,
+                                embed=Embed.from_dict(row.embed) if row.embed else None,
+                                message=row.message,
+                                chapter_id=row.chapter_id,
+                            )
+                        )
+                    if dropped:
+                        # The entry was paused or removed, or its channel is gone.
+                        logger.debug("Dropping %s undeliverable updates", len(dropped))
+                        await PendingUpdate.filter(id__in=dropped).update(
+                            delivered=datetime.now(UTC)
+                        )
+                    if unavailable:
+                        logger.debug(
+                            "Postponing %s updates for unavailable guilds",
+                            len(unavailable),
+                        )
+                        await self.postpone(
+                            PendingUpdate.filter(id__in=unavailable)
+                        )
+                    merged_updates = self.merge_updates(updates)
+                    span.add("dropped", len(dropped))
+                    span.add("threads", len(merged_updates))
+                    logger.debug(
+                        "Merged %s updates into %s threads",
+                        len(updates),
+                        len(merged_updates),
+                    )
+                    entry_tasks: dict[str, list[UpdateEntry]] = defaultdict(list)
+                    for entry in merged_updates:
+                        logger.debug("Found entry: %s", entry)
+                        entry_tasks[entry.entry.guild_id].append(entry)
+                    delivery_before = self.bot.delivery.report()
+                    postponed_before = self.postponed
+                    delivery_start = monotonic()
+                    await gather(
+                        *[self.process_guild(item) for item in entry_tasks.values()]
+                    )
+                    elapsed = monotonic() - delivery_start
+                    self.bot.metrics.observe("delivery_seconds", elapsed)
+                    delivered = (
+                        self.bot.delivery.delivered - delivery_before["delivered"]
+                    )
+                    logger.info(
+                        "Delivered %s updates with %s API calls in %.1f seconds (%.2f updates/s)",
+                        delivered,
+                        self.bot.delivery.api_calls - delivery_before["api_calls"],
+                        elapsed,
+                        delivered / elapsed if elapsed else 0,
+                    )
+                    if (
+                        not delivered
+                        and not dropped
+                        and self.postponed == postponed_before
+                    ):
+                        return  # Nothing changed, so the next batch would be the same.
+
+    @Cog.listener()
+    async def on_guild_available(self, guild: Guild):
+        self.bot.threads.load_guild(guild)
+
+    @Cog.listener()
+    async def on_guild_join(self, guild: Guild):
+        self.bot.threads.load_guild(guild)
+
+    @Cog.listener()
+    async def on_guild_remove(self, guild: Guild):
+        self.bot.threads.forget_guild(guild.id)
+
+    @Cog.listener()
+    async def on_thread_create(self, thread: Thread):
+        self.bot.threads.add(thread)
+
+    @Cog.listener()
+    async def on_thread_update(self, before: Thread, after: Thread):
+        self.bot.threads.add(after)
+
+    @Cog.listener()
+    async def on_raw_thread_delete(self, payload: RawThreadDeleteEvent):
+        self.bot.threads.remove(payload.guild_id, payload.thread_id)
 
     @command()
     @is_owner()
     async def stop(self, ctx: Context):
-        """Safely stop the update checker after its next iteration."""
-        self.update_check.stop()
+        """Safely stop the update checker after each source's current check."""
+        self.poller.scheduler.stop()
         await ctx.send("Queued update checker for stopping.")
 
 
@@ -1,7 +1,11 @@
 """Methods for managing configuration values via a database."""
 import logging
-from asyncio import gather
-from typing import Any
+from asyncio import Task, create_task, sleep
+from json import loads
+from typing import Any, Dict, Optional, Set
+
+from pypika import Table
+from tortoise import connections
 
 from .models import Metadata
 
@@ -9,20 +13,38 @@ logger = logging.getLogger(__name__)
 
 
 class ConfigManager:
+    """Config values stored as :class:`.Metadata` rows.
+
+    In write-behind mode, changes are flushed in one batch ``flush_delay`` seconds after the
+    first unsaved change instead of waiting for an explicit :meth:`save`.
+    """
+
     last_updated: int
 
-    def __init__(self, data: dict):
+    _internal_attributes = {
+        "data",
+        "changed",
+        "deleted",
+        "write_behind",
+        "flush_delay",
+        "flush_task",
+    }
+
+    def __init__(self, data: dict, write_behind: bool = False, flush_delay: float = 5):
         self.data = data
         self.changed = set()
         self.deleted = set()
+        self.write_behind = write_behind
+        self.flush_delay = flush_delay
+        self.flush_task: Optional[Task] = None
 
     @classmethod
-    async def get(cls):
+    async def get(cls, **kwargs: Any):
         all_metadata = await Metadata.all()
         data = {}
         for item in all_metadata:
             data[item.key] = item
-        return cls(data)
+        return cls(data, **kwargs)
 
     def __getattr__(self, item: str) -> Any:
         try:
@@ -31,21 +53,87 @@ class ConfigManager:
             raise AttributeError(item) from None
 
     def __setattr__(self, key: str, value: Any) -> None:
-        if key in ["data", "changed", "deleted"]:
+        if key in self._internal_attributes:
             return super().__setattr__(key, value)
         if key not in self.data:
             self.data[key] = Metadata(key=key, value=value)
         else:
             self.data[key].value = value
         self.changed.add(key)
+        self.deleted.discard(key)
+        self.schedule_flush()
 
     def __delattr__(self, item: str):
-        self.deleted.add(self.data[item])
+        self.deleted.add(item)
+        self.changed.discard(item)
         del self.data[item]
+        self.schedule_flush()
+
+    def schedule_flush(self):
+        if self.write_behind and (self.flush_task is None or self.flush_task.done()):
+            self.flush_task = create_task(self.delayed_flush())
+
+    async def delayed_flush(self):
+        await sleep(self.flush_delay)
+        try:
+            await self.save()
+        except Exception:
+            logger.exception("Error flushing config")
+
+    async def increment(self, deltas: Dict[str, float]):
+        """Add to numeric keys in the database and load their new values.
+
+        Unlike setting and saving them, this does not lose what other processes added.
+        """
+        if not deltas:
+            return
+        rows = await connections.get("default").execute_query_dict(
+            'INSERT INTO "metadata" ("key", "value") SELECT key, to_jsonb(delta) '
+            "FROM unnest($1::varchar[], $2::float8[]) AS deltas(key, delta) "
+            'ON CONFLICT ("key") DO UPDATE '
+            'SET "value" = to_jsonb("metadata"."value"::float8 + EXCLUDED."value"::float8) '
+            'RETURNING "key", "value"',
+            [list(deltas), list(deltas.values())],
+        )
+        for row in rows:
+            value = row["value"]
+            if isinstance(value, str):
+                value = loads(value)
+            if row["key"] in self.data:
+                self.data[row["key"]].value = value
+            else:
+                self.data[row["key"]] = Metadata(key=row["key"], value=value)
 
     async def save(self):
-        logger.debug("Saving %s, Deleting %s", self.changed, self.deleted)
-        await gather(*[self.data[item].save() for item in self.changed])
-        await gather(*[item.delete() for item in self.deleted])
-        self.changed.clear()
-        self.deleted.clear()
+        """Upsert every changed key in one query and delete every deleted key in another."""
+        changed, self.changed = self.changed, set()
+        deleted, self.deleted = self.deleted, set()
+        logger.debug("Saving %s, Deleting %s", changed, deleted)
+        try:
+            if changed:
+                await self.upsert(changed)
+            if deleted:
+                await Metadata.filter(key__in=deleted).delete()
+        except Exception:
+            # Keep the keys around so the next save retries them.
+            self.changed |= changed & self.data.keys()
+            self.deleted |= deleted - self.data.keys()
+            raise
+
+    async def upsert(self, keys: Set[str]):
+        """Insert or update keys in one query.
+
+        ``Metadata.bulk_create`` cannot be used: on models without generated columns, tortoise
+        adds the conflict target and updates twice, which SQLite and Postgres reject.
+        """
+        connection = connections.get("default")
+        value_field = Metadata._meta.fields_map["value"]
+        query = connection.query_class.into(Table(Metadata._meta.db_table)).columns(
+            "key", "value"
+        )
+        for key in keys:
+            item = self.data[key]
+            query = query.insert(key, value_field.to_db_value(item.value, item))
+        await connection.execute_query(
+            str(query.on_conflict("key").do_update("value"))
+        )
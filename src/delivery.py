@@ -0,0 +1,79 @@
+"""Scheduling of Discord API calls made while delivering updates."""
+import logging
+from asyncio import Lock, Semaphore, sleep
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from time import monotonic
+from typing import AsyncIterator, DefaultDict, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class RateBudget:
+    """A token bucket allowing ``rate`` calls every ``per`` seconds."""
+
+    def __init__(self, rate: int, per: float):
+        self.rate = rate
+        self.per = per
+        self.tokens = float(rate)
+        self.updated = monotonic()
+        self.lock = Lock()
+
+    async def spend(self):
+        async with self.lock:
+            while True:
+                now = monotonic()
+                self.tokens = min(
+                    self.rate, self.tokens + (now - self.updated) * self.rate / self.per
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await sleep((1 - self.tokens) * self.per / self.rate)
+
+
+class DeliveryScheduler:
+    """Bounds concurrent deliveries and paces their API calls.
+
+    discord.py keeps the authoritative per-route buckets and waits on them itself; these
+    budgets keep deliveries from queueing up far more requests than Discord will accept,
+    using Discord's documented global limit (50 requests per second) and a per-guild budget.
+    """
+
+    def __init__(
+        self,
+        max_deliveries: int = 20,
+        per_guild_deliveries: int = 5,
+        global_rate: int = 50,
+        guild_rate: int = 10,
+        guild_per: float = 5,
+    ):
+        self.deliveries = Semaphore(max_deliveries)
+        self.per_guild_deliveries = per_guild_deliveries
+        self.guild_deliveries: DefaultDict[int, Semaphore] = defaultdict(
+            lambda: Semaphore(self.per_guild_deliveries)
+        )
+        self.global_budget = RateBudget(global_rate, 1)
+        self.guild_budgets: DefaultDict[int, RateBudget] = defaultdict(
+            lambda: RateBudget(guild_rate, guild_per)
+        )
+        self.delivered = 0
+        self.api_calls = 0
+
+    @asynccontextmanager
+    async def delivery(self, guild_id: int) -> AsyncIterator[None]:
+        """Hold a delivery slot for the guild while delivering one update."""
+        async with self.guild_deliveries[guild_id], self.deliveries:
+            yield
+        self.delivered += 1
+
+    async def spend(self, guild_id: int, calls: int = 1):
+        """Wait until the budgets allow ``calls`` more API calls for the guild."""
+        for _ in range(calls):
+            await self.guild_budgets[guild_id].spend()
+            await self.global_budget.spend()
+        self.api_calls += calls
+
+    def report(self) -> Dict[str, int]:
+        return {"delivered": self.delivered, "api_calls": self.api_calls}
@@ -0,0 +1,38 @@
+"""Fan-out of new outbox rows to every bot process of a sharded deployment."""
+import logging
+from typing import Callable, Optional
+
+import asyncpg
+from tortoise import connections
+
+from .orm import TORTOISE_ORM
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxChannel:
+    """A Postgres ``LISTEN``/``NOTIFY`` channel announcing that updates were queued.
+
+    Notifications are only a hint to drain the outbox early; processes still drain it
+    periodically in case one is missed.
+    """
+
+    channel = "mangareleasebot_outbox"
+
+    def __init__(self):
+        self.connection: Optional[asyncpg.Connection] = None
+
+    async def listen(self, callback: Callable[[], None]):
+        # LISTEN needs a connection of its own, so it cannot come from tortoise's pool.
+        credentials = TORTOISE_ORM["connections"]["default"]["credentials"]
+        self.connection = await asyncpg.connect(**credentials)
+        await self.connection.add_listener(self.channel, lambda *args: callback())
+        logger.debug("Listening for outbox notifications")
+
+    async def notify(self):
+        await connections.get("default").execute_script(f"NOTIFY {self.channel}")
+
+    async def close(self):
+        if self.connection is not None:
+            await self.connection.close()
+            self.connection = None
@@ -0,0 +1,137 @@
+"""In-process counters and histograms.
+
+Everything runs on the bot's event loop, so plain dictionaries are updated without locks.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from time import perf_counter
+from typing import Dict, Iterator, List, Sequence, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .config_manager import ConfigManager
+
+Labels = Tuple[Tuple[str, str], ...]
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+def format_value(value: float) -> str:
+    """Format a counter value exactly, without an exponent for whole numbers."""
+    if isinstance(value, int) or value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Metrics:
+    """A registry of counters and histograms, keyed by name and labels."""
+
+    prefix = "mangareleasebot_"
+
+    def __init__(self):
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        #: Counter values that have already been added to the database.
+        self.persisted: Dict[str, float] = {}
+
+    def inc(self, name: str, amount: float = 1, **labels: str):
+        counter = self.counters.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        counter[key] = counter.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels: str):
+        histograms = self.histograms.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        if key not in histograms:
+            histograms[key] = Histogram()
+        histograms[key].observe(value)
+
+    @contextmanager
+    def time(self, name: str, **labels: str) -> Iterator[None]:
+        """Observe how long the block takes, in seconds."""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, perf_counter() - start, **labels)
+
+    def unpersisted(self) -> Dict[str, float]:
+        """Get how much each unlabelled counter grew since the last call."""
+        deltas = {}
+        for name, values in self.counters.items():
+            total = values.get((), 0)
+            delta = total - self.persisted.get(name, 0)
+            if delta:
+                deltas[name] = delta
+                self.persisted[name] = total
+        return deltas
+
+    async def persist(self, config_manager: "ConfigManager"):
+        """Add the growth of unlabelled counters to their config keys, e.g. ``messages``.
+
+        The keys are incremented in the database, so every process sharing it can persist
+        its own counters.
+        """
+        deltas = self.unpersisted()
+        try:
+            await config_manager.increment(deltas)
+        except Exception:
+            # Add the growth again on the next call.
+            for name, delta in deltas.items():
+                self.persisted[name] -= delta
+            raise
+
+    def summary(self) -> List[str]:
+        lines = []
+        for name, values in sorted(self.counters.items()):
+            for labels, value in sorted(values.items()):
+                lines.append(f"{name}{format_labels(labels)}: {format_value(value)}")
+        for name, histograms in sorted(self.histograms.items()):
+            for labels, histogram in sorted(histograms.items()):
+                average = histogram.sum / histogram.count if histogram.count else 0
+                lines.append(
+                    f"{name}{format_labels(labels)}: {histogram.count} samples, "
+                    f"{average:.3f}s average"
+                )
+        return lines
+
+    def render_prometheus(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        for name, values in sorted(self.counters.items()):
+            full_name = f"{self.prefix}{name}_total"
+            lines.append(f"# TYPE {full_name} counter")
+            for labels, value in sorted(values.items()):
+                lines.append(f"{full_name}{format_labels(labels)} {format_value(value)}")
+        for name, histograms in sorted(self.histograms.items()):
+            full_name = f"{self.prefix}{name}"
+            lines.append(f"# TYPE {full_name} histogram")
+            for labels, histogram in sorted(histograms.items()):
+                cumulative = 0
+                for bound, count in zip((*histogram.buckets, "+Inf"), histogram.counts):
+                    cumulative += count
+                    bucket_labels = format_labels((*labels, ("le", str(bound))))
+                    lines.append(f"{full_name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{full_name}_sum{format_labels(labels)} {histogram.sum}")
+                lines.append(
+                    f"{full_name}_count{format_labels(labels)} {histogram.count}"
+                )
+        return "\n".join(lines) + "\n"
@@ -7,11 +7,13 @@ from tortoise.fields import (
     BooleanField,
     CharField,
     DatetimeField,
+    FloatField,
     ForeignKeyField,
     ForeignKeyRelation,
     IntField,
     JSONField,
     ReverseRelation,
+    TextField,
 )
 
 
@@ -30,6 +32,7 @@ class MangaEntry(Model):
 
     pings: ReverseRelation["Ping"]
     threads: ReverseRelation["ThreadData"]
+    pending_updates: ReverseRelation["PendingUpdate"]
 
     class Meta:
         indexes = (("guild_id", "channel_id"),)
@@ -62,3 +65,46 @@ class ThreadData(Model):
     @property
     def created_at(self) -> datetime:
         return snowflake_time(self.thread_id)
+
+
+class PendingUpdate(Model):
+    """An update that was found by a source but may not have been delivered yet."""
+
+    id = IntField(pk=True)
+    entry: ForeignKeyRelation[MangaEntry] = ForeignKeyField(
+        "models.MangaEntry",
+        related_name="pending_updates",
+        on_delete="CASCADE",
+        index=True,
+    )
+    chapter_id = CharField(256, null=False)
+    thread_title = CharField(100, null=False)
+    message = TextField(null=True)
+    embed = JSONField(null=True)
+    created = DatetimeField(null=False, auto_now_add=True)
+    delivered = DatetimeField(null=True, index=True)
+    attempts = IntField(null=False, default=0)
+    #: Failed and postponed updates are not delivered again before this time.
+    retry_at = DatetimeField(null=True)
+    #: The shard of the entry's guild, so each process only drains its own guilds.
+    shard = IntField(null=False, default=0, index=True)
+
+    entry_id: int
+
+    class Meta:
+        unique_together = (("entry", "chapter_id"),)
+
+
+class ItemActivity(Model):
+    """When an item of a source was last checked and how often it releases chapters."""
+
+    id = IntField(pk=True)
+    source_id = CharField(20, null=False)
+    item_id = CharField(1024, null=False)
+    created = DatetimeField(null=False, auto_now_add=True)
+    last_checked = DatetimeField(null=True)
+    last_release = DatetimeField(null=True)
+    release_interval = FloatField(null=True)
+
+    class Meta:
+        unique_together = (("source_id", "item_id"),)
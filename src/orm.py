@@ -1,6 +1,13 @@
 from tortoise import Tortoise
 
-from .models import MangaEntry, Metadata, Ping, ThreadData  # noqa
+from .models import (  # noqa
+    ItemActivity,
+    MangaEntry,
+    Metadata,
+    PendingUpdate,
+    Ping,
+    ThreadData,
+)
 
 TORTOISE_ORM = {
     "connections": {
@@ -0,0 +1,106 @@
+"""A process that polls sources and queues updates without connecting to Discord."""
+import asyncio
+import logging
+import signal
+from os import getenv
+from typing import Optional
+
+from aiohttp import ClientSession
+from hondana import Client
+from tortoise import Tortoise
+
+from .activity import ActivityTracker
+from .config import mangadex_password, mangadex_username
+from .config_manager import ConfigManager
+from .fanout import OutboxChannel
+from .metrics import Metrics
+from .orm import init
+from .polling import UpdatePoller
+from .sources import make_source_map
+from .subscriptions import SubscriptionIndex
+from .tracing import Tracer
+from .utils.http import HostLimiter, ResponseCache
+
+logger = logging.getLogger(__name__)
+
+
+class Poller:
+    """Polls every source and stores the updates in the outbox for the bot to deliver.
+
+    Run it next to bot processes started with ``POLL_SOURCES=0``; they are notified of new
+    updates through the :class:`.OutboxChannel`. ``SHARD_COUNT`` has to match the bot's so
+    updates are queued for the right shard. Subscriptions are reloaded from the database every
+    ``SUBSCRIPTION_REFRESH`` seconds (60 by default), since the bot's commands only update the
+    bot's own index.
+    """
+
+    def __init__(self):
+        self.config_manager: Optional[ConfigManager] = None
+        self.session: Optional[ClientSession] = None
+        self.hondana: Optional[Client] = None
+        self.host_limiter = HostLimiter()
+        self.http_cache = ResponseCache(path=getenv("HTTP_CACHE_FILE"))
+        self.subscriptions = SubscriptionIndex()
+        self.item_activity = ActivityTracker()
+        self.metrics = Metrics()
+        self.tracer = Tracer(enabled=bool(getenv("TRACING")))
+        self.outbox_channel = OutboxChannel()
+        shard_count = getenv("SHARD_COUNT")
+        self.shard_count = int(shard_count) if shard_count else None
+        self.source_map = make_source_map(self)
+        self.polling = UpdatePoller(
+            self,
+            notify=True,
+            subscription_max_age=float(getenv("SUBSCRIPTION_REFRESH", "60")),
+        )
+
+    def shard_of(self, guild_id: int) -> int:
+        return (guild_id >> 22) % (self.shard_count or 1)
+
+    async def wait_until_ready(self):
+        pass  # Nothing to wait for without a gateway connection.
+
+    async def setup(self):
+        await init()
+        self.config_manager = await ConfigManager.get(write_behind=True)
+        for source in self.source_map.values():
+            await source.upgrade_configs()
+        await self.subscriptions.load()
+        await self.item_activity.load()
+        self.session = ClientSession()
+        self.http_cache.load()
+        self.hondana = Client(
+            session=self.session, username=mangadex_username, password=mangadex_password
+        )
+
+    async def close(self):
+        if self.config_manager.flush_task:
+            self.config_manager.flush_task.cancel()
+        await self.metrics.persist(self.config_manager)
+        await self.config_manager.save()
+        for source in self.source_map.values():
+            source.close()
+        self.http_cache.save()
+        await self.session.close()
+        await Tortoise.close_connections()
+
+    async def run(self):
+        """Poll until SIGINT or SIGTERM, then let every source finish its current poll."""
+        stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stopping.set)
+        await self.setup()
+        try:
+            self.polling.start()
+            logger.info("Polling %s sources", len(self.source_map))
+            await stopping.wait()
+            logger.info("Stopping after the current polls")
+            self.polling.scheduler.stop()
+            await asyncio.gather(*self.polling.scheduler.tasks.values())
+        finally:
+            await self.close()
+
+
+def main():
+    asyncio.run(Poller().run())
@@ -0,0 +1,240 @@
+"""Polling sources for updates and queueing them in the outbox, independent of Discord."""
+import logging
+from asyncio import Lock
+from collections import defaultdict
+from datetime import datetime, timedelta
+from time import monotonic
+from typing import Dict, List, Optional, Sequence, TYPE_CHECKING
+from zoneinfo import ZoneInfo
+
+from .models import MangaEntry, PendingUpdate
+from .scheduler import SourceScheduler
+from .sources import BaseSource
+from .sources.base import UpdateEntry
+
+if TYPE_CHECKING:
+    from .bot import MangaReleaseBot
+
+UTC = ZoneInfo("UTC")
+logger = logging.getLogger(__name__)
+
+
+class UpdatePoller:
+    """Poll every source on its schedule and store what they find in the outbox.
+
+    This only needs the database and the sources, so it runs both inside the bot and in the
+    standalone poller process (see :mod:`src.poller`).
+
+    :param notify: Announce queued updates on the bot's :class:`.OutboxChannel`, for bot
+        processes that do not share this one's event loop.
+    :param subscription_max_age: Reload the subscription index before a poll once it is this
+        many seconds old. None trusts the index to be kept up to date by this process.
+    """
+
+    def __init__(
+        self,
+        bot: "MangaReleaseBot",
+        *,
+        notify: bool = False,
+        subscription_max_age: Optional[float] = None,
+    ):
+        self.bot = bot
+        self.notify = notify
+        self.subscription_max_age = subscription_max_age
+        self.subscriptions_loaded = monotonic()
+        self.subscriptions_lock = Lock()
+        self.scheduler = SourceScheduler(bot, self.poll_source)
+
+    def last_updated(self, source: str) -> datetime:
+        return datetime.fromtimestamp(
+            getattr(
+                self.bot.config_manager,
+                f"last_updated_{source}",
+                self.bot.config_manager.last_updated,
+            ),
+            tz=UTC,
+        )
+
+    def start(self):
+        self.bot.config_manager.last_updated = getattr(
+            self.bot.config_manager, "last_updated", 1650600000
+        )
+        self.scheduler.start()
+
+    def visible(self, guild_id: int, channel_id: int) -> bool:
+        """Whether updates for a channel can be delivered.
+
+        Without a guild cache every channel counts as visible; the bot drops undeliverable
+        updates when it drains the outbox.
+        """
+        return True
+
+    async def update_check_source(
+        self,
+        source: BaseSource,
+        data: Dict[str, Sequence[MangaEntry]],
+        last_updated: Optional[datetime] = None,
+    ) -> Optional[List[UpdateEntry]]:
+        """Check a source for updates, returning None if the check failed.
+
+        The source's cursor is not moved; see :meth:`advance_cursor`.
+        """
+        last_updated = last_updated or self.last_updated(source.source_name)
+        try:
+            data = await source.check_updates(last_updated, data)
+        except Exception as e:
+            logger.error(f"Error checking updates for {source.source_name}: {e}")
+            return None
+        return data
+
+    def advance_cursor(self, source: BaseSource, checked_at: datetime):
+        """Move the source's cursor once the updates found up to ``checked_at`` are queued."""
+        setattr(
+            self.bot.config_manager,
+            f"last_updated_{source.source_name}",
+            checked_at.timestamp(),
+        )
+
+    async def refresh_subscriptions(self):
+        """Reload the subscription index if it is older than :attr:`subscription_max_age`."""
+        if self.subscription_max_age is None:
+            return
+        async with self.subscriptions_lock:
+            if monotonic() - self.subscriptions_loaded < self.subscription_max_age:
+                return
+            drift = await self.bot.subscriptions.load()
+            self.subscriptions_loaded = monotonic()
+            logger.debug("Reloaded subscriptions with %s changes", drift)
+
+    def load_subscriptions(
+        self, source_id: Optional[str] = None
+    ) -> Dict[str, Dict[str, List[MangaEntry]]]:
+        """Get every active entry whose channel is visible, grouped by source and item ID.
+
+        :param source_id: Only get the entries of this source.
+        :type source_id: Optional[str]
+        """
+        index = self.bot.subscriptions
+        by_source: Dict[str, Dict[str, List[MangaEntry]]] = defaultdict(
+            lambda: defaultdict(list)
+        )
+        for guild_id, channel_ids in index.by_guild.items():
+            for channel_id in channel_ids:
+                if self.visible(guild_id, channel_id):
+                    for item in index.channel_entries(channel_id):
+                        if source_id is not None and item.source_id != source_id:
+                            continue
+                        by_source[item.source_id][item.item_id].append(item)
+        return by_source
+
+    async def poll_source(self, source_id: str, source: BaseSource):
+        """Check one source for updates and queue them for delivery."""
+        await self.bot.wait_until_ready()
+        await self.refresh_subscriptions()
+        logger.debug(
+            "Starting update check for %s (last checked at %s)",
+            source.source_name,
+            self.last_updated(source.source_name),
+        )
+        cur_time = datetime.now(UTC)
+        by_item_id = self.load_subscriptions(source_id).get(source_id)
+        if not by_item_id:
+            return
+        adaptive = [item_id for item_id in by_item_id if source.adaptive_item(item_id)]
+        with self.bot.tracer.span("split_due", items=len(by_item_id)) as span:
+            due, since = self.bot.item_activity.split_due(
+                source_id,
+                by_item_id,
+                cur_time,
+                timedelta(seconds=self.scheduler.interval(source)),
+                adaptive,
+            )
+            span.set(due=len(due))
+        if not due:
+            return
+        # Items skipped by earlier polls have to be checked from when they were last checked.
+        # Anything found again is ignored by the outbox.
+        last_updated = self.last_updated(source.source_name)
+        window_start = last_updated
+        if since is not None and since < last_updated:
+            window_start = since
+        if source.can_skip_items(due, window_start):
+            last_updated = window_start
+        else:
+            # The whole feed is walked anyway, so check every item, including the ones earlier
+            # polls skipped as not due, from when the earliest of them was last checked.
+            due = by_item_id
+            earliest = self.bot.item_activity.earliest_check(source_id, adaptive)
+            if earliest is not None and earliest < last_updated:
+                last_updated = earliest
+        logger.debug("Providing %s to %s", due, type(source).__name__)
+        with self.bot.tracer.span("check_updates") as span:
+            updates = await self.update_check_source(source, due, last_updated)
+            if updates is None:
+                return
+            span.set(updates=len(updates))
+        logger.debug("Got entries: %s", updates)
+        with self.bot.tracer.span("enqueue", updates=len(updates)):
+            queued = await self.enqueue_updates(updates)
+        # The updates are safe in the outbox now. Had the insert failed, they would be found again.
+        self.advance_cursor(source, cur_time)
+        if queued and self.notify:
+            await self.bot.outbox_channel.notify()
+        # Updates found again by a widened window are not new releases.
+        self.bot.item_activity.record(
+            source_id,
+            [item_id for item_id in adaptive if item_id in due],
+            [update.entry.item_id for update in queued],
+            cur_time,
+        )
+        with self.bot.tracer.span("save_state"):
+            await self.bot.item_activity.save()
+            self.bot.config_manager.last_updated = int(cur_time.timestamp())
+            await self.bot.config_manager.save()
+        self.polled()
+
+    def polled(self):
+        """Called after a poll queued its updates. Overridden to start delivering them."""
+
+    @staticmethod
+    def outbox_chapter_id(update: UpdateEntry) -> str:
+        return update.chapter_id or update.thread_title
+
+    async def enqueue_updates(self, updates: List[UpdateEntry]) -> List[UpdateEntry]:
+        """Store updates in the outbox. Updates already in it are ignored.
+
+        :return: The updates that were not in the outbox yet.
+        :rtype: List[UpdateEntry]
+        """
+        if not updates:
+            return []
+        existing = set(
+            await PendingUpdate.filter(
+                entry_id__in=list({update.entry.id for update in updates}),
+                chapter_id__in=list(
+                    {self.outbox_chapter_id(update) for update in updates}
+                ),
+            ).values_list("entry_id", "chapter_id")
+        )
+        updates = [
+            update
+            for update in updates
+            if (update.entry.id, self.outbox_chapter_id(update)) not in existing
+        ]
+        await PendingUpdate.bulk_create(
+            [
+                PendingUpdate(
+                    entry_id=update.entry.id,
+                    chapter_id=self.outbox_chapter_id(update),
+                    thread_title=update.thread_title,
+                    message=update.message,
+                    embed=update.embed.to_dict() if update.embed else None,
+                    shard=self.bot.shard_of(update.entry.guild_id),
+                )
+                for update in updates
+            ],
+            ignore_conflicts=True,
+        )
+        self.bot.metrics.inc("updates_queued", len(updates))
+        logger.debug("Queued %s updates for delivery", len(updates))
+        return updates
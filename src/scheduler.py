@@ -0,0 +1,78 @@
+"""Independent polling schedules for each source."""
+import logging
+from asyncio import Event, Task, TimeoutError, create_task, wait_for
+from random import uniform
+from time import monotonic
+from typing import Awaitable, Callable, Dict, TYPE_CHECKING
+
+from .sources import BaseSource
+
+if TYPE_CHECKING:
+    from .bot import MangaReleaseBot
+
+logger = logging.getLogger(__name__)
+
+
+class SourceScheduler:
+    """Poll every source on its own cadence, so a slow source does not delay the others.
+
+    The interval of a source is :attr:`.BaseSource.poll_interval` unless the
+    ``poll_interval_<source name>`` config key overrides it, and each wait is extended by up to
+    :attr:`.BaseSource.poll_jitter` seconds.
+    """
+
+    def __init__(
+        self,
+        bot: "MangaReleaseBot",
+        poll: Callable[[str, BaseSource], Awaitable[None]],
+    ):
+        self.bot = bot
+        self.poll = poll
+        self.tasks: Dict[str, Task] = {}
+        self.stopping = Event()
+
+    def interval(self, source: BaseSource) -> float:
+        return getattr(
+            self.bot.config_manager,
+            f"poll_interval_{source.source_name}",
+            source.poll_interval,
+        )
+
+    def start(self):
+        self.stopping.clear()
+        for source_id, source in self.bot.source_map.items():
+            if source_id not in self.tasks or self.tasks[source_id].done():
+                self.tasks[source_id] = create_task(self.run(source_id, source))
+
+    def stop(self):
+        """Stop every source after its current poll finishes."""
+        self.stopping.set()
+
+    def cancel(self):
+        for task in self.tasks.values():
+            task.cancel()
+        self.tasks.clear()
+
+    async def run(self, source_id: str, source: BaseSource):
+        while not self.stopping.is_set():
+            start = monotonic()
+            try:
+                with self.bot.tracer.span("poll", source=source.source_name):
+                    await self.poll(source_id, source)
+            except Exception:
+                logger.exception("Error polling %s", source.source_name)
+            elapsed = monotonic() - start
+            self.bot.metrics.observe("poll_seconds", elapsed, source=source.source_name)
+            delay = max(0.0, self.interval(source) - elapsed) + uniform(
+                0, source.poll_jitter
+            )
+            logger.debug(
+                "Polled %s in %.1f seconds, next poll in %.1f seconds",
+                source.source_name,
+                elapsed,
+                delay,
+            )
+            try:
+                await wait_for(self.stopping.wait(), delay)
+            except TimeoutError:
+                pass
@@ -1,7 +1,18 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Any, ClassVar, Dict, List, Optional, Pattern, Sequence, TYPE_CHECKING
+from typing import (
+    Any,
+    ClassVar,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Pattern,
+    Sequence,
+    Tuple,
+    TYPE_CHECKING,
+)
 
 from discord import Embed, File
 from discord.ui import Modal
@@ -20,6 +31,10 @@ class UpdateEntry:
     thread_title: str
     embed: Optional[Embed] = None
     message: Optional[str] = None
+    #: Identifies the chapter within the source, so overlapping subscriptions can share a thread.
+    chapter_id: Optional[str] = None
+    #: Other entries in the same channel whose pings are delivered in this entry's thread.
+    merged: Tuple[MangaEntry, ...] = ()
 
 
 class BaseModal(ABC, Modal, title="Apply Customizations"):
@@ -75,7 +90,9 @@ class BaseModal(ABC, Modal, title="Apply Customizations"):
                 f"Customizations for entry #{self.entry.id} were reset to default."
             )
             self.entry.extra_config = self.source.default_customizations
+            self.source.invalidate(self.entry)
             await self.entry.save()
+            await interaction.client.subscriptions.refresh(self.entry.id)
         else:
             await save_config(self.entry, customizations, interaction)
 
@@ -88,10 +105,32 @@ class BaseSource(ABC):
     source_name: ClassVar[str]
     url_regex: ClassVar[Pattern]
     default_customizations: ClassVar[Optional[Dict[str, Any]]] = None
+    #: Seconds between two polls of the source.
+    poll_interval: ClassVar[float] = 10 * 60
+    #: Up to this many seconds are randomly added to each wait between polls.
+    poll_jitter: ClassVar[float] = 30
+    #: The maximum number of concurrent requests to the source's host.
+    max_concurrency: ClassVar[int] = 5
 
     def __init__(self, bot: "MangaReleaseBot"):
         self.bot = bot
 
+    async def get_json(self, url: str) -> Any:
+        """Fetch a JSON document over the bot's session, limiting concurrent requests per host.
+        Responses are revalidated through the bot's :class:`~.ResponseCache`.
+
+        :param url: The URL to fetch.
+        :type url: str
+        :raises aiohttp.ClientResponseError: If the response has an error status.
+        :return: The decoded JSON body.
+        :rtype: Any
+        """
+        async with self.bot.host_limiter.limit(url, self.max_concurrency):
+            with self.bot.metrics.time(
+                "source_request_seconds", source=self.source_name
+            ), self.bot.tracer.span("http.get", url=url):
+                return await self.bot.http_cache.get_json(self.bot.session, url)
+
     @abstractmethod
     async def get_id(self, url: str) -> Optional[str]:
         """Get the ID of the item from the URL. Return None if not found."""
@@ -128,6 +167,45 @@ class BaseSource(ABC):
         """
         return
 
+    def adaptive_item(self, item_id: str) -> bool:
+        """Whether the item follows a single series, so it can be polled less often when it
+        rarely releases chapters. Wildcards and other broad items are checked every poll.
+
+        :param item_id: The item ID of an entry.
+        :type item_id: str
+        :rtype: bool
+        """
+        return item_id != "*"
+
+    def can_skip_items(self, item_ids: Iterable[str], last_update: datetime) -> bool:
+        """Whether checking only some items since ``last_update`` is cheaper than checking
+        every item. Sources that walk their whole feed anyway return False, so every item is
+        checked, from when the item checked longest ago was last checked.
+
+        :param item_ids: The item IDs that are due.
+        :type item_ids: Iterable[str]
+        :param last_update: When the oldest of these items was last checked.
+        :type last_update: datetime
+        :rtype: bool
+        """
+        return True
+
+    async def upgrade_configs(self):
+        """Bring the stored configs of this source's entries up to date. Called once at startup."""
+        return
+
+    def invalidate(self, entry: MangaEntry):
+        """Drop anything cached for the entry because its configuration changed.
+
+        :param entry: The entry whose configuration changed.
+        :type entry: MangaEntry
+        """
+        return
+
+    def close(self):
+        """Release anything the source holds, like worker processes. Called on shutdown."""
+        return
+
     @abstractmethod
     async def check_updates(
         self, last_update: datetime, data: Dict[str, Sequence[MangaEntry]]
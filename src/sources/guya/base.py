@@ -1,12 +1,15 @@
 import re
+from asyncio import gather
 from datetime import datetime
 from typing import Dict, List, Optional, Sequence
 
+from aiohttp import ClientResponseError
 from discord import Embed
 from guyamoe_api_types import AllSeries, Chapter, Series
 
 from ..base import BaseSource, UpdateEntry
 from ...models import MangaEntry
+from ...tracing import current_span
 
 
 def get_preferred_chapter_data(
@@ -38,55 +41,78 @@ class Guya(BaseSource):
         slug = self.url_regex.search(url).group(1)
         if slug == "*":
             return slug
-        async with self.bot.session.get(f"{self.base_endpoint}/series/{slug}") as resp:
-            if resp.status == 404:
+        try:
+            await self.get_json(f"{self.base_endpoint}/series/{slug}")
+        except ClientResponseError as e:
+            if e.status == 404:
                 return
-            resp.raise_for_status()
+            raise
         return slug
 
+    def series_updates(
+        self,
+        slug: str,
+        data: Series,
+        last_updated_int: int,
+        entries: Sequence[MangaEntry],
+    ) -> List[UpdateEntry]:
+        updates = []
+        for chapter_num, chapter in data["chapters"].items():
+            group_pages, group_release_date, group_id = get_preferred_chapter_data(
+                chapter, data["preferred_sort"]
+            )
+            if group_release_date >= last_updated_int:
+                embed = Embed(
+                    title=f"New chapter released! {data['title']} Chapter {chapter_num}",
+                    url=f"{self.website_endpoint}/read/manga/{slug}/{chapter_num}",
+                    timestamp=datetime.fromtimestamp(group_release_date),
+                )
+                embed.set_image(
+                    url=f"{self.website_endpoint}/media/manga/{slug}/chapters/{chapter['folder']}/{group_id}/"
+                    f"{group_pages[0]}"
+                )
+                if chapter["title"]:
+                    embed.title += f": {chapter['title']}"
+                title = data["title"]
+                suffix = f" Chapter {chapter_num}"
+                if len(title) + len(suffix) > 100:  # Max thread title length is 100.
+                    title = title[: 100 - len(suffix) - 1] + "…"
+                for item in entries:
+                    updates.append(
+                        UpdateEntry(
+                            item,
+                            title + suffix,
+                            embed=embed,
+                            chapter_id=f"{slug}/{chapter_num}",
+                        )
+                    )
+        return updates
+
     async def check_updates(
         self, last_update: datetime, id_data: Dict[str, Sequence[MangaEntry]]
     ) -> List[UpdateEntry]:
-        updates = []
         last_updated_int = int(last_update.timestamp())
+        data: AllSeries = await self.get_json(f"{self.base_endpoint}/get_all_series")
+        series_updated = {item["slug"]: item["last_updated"] for item in data.values()}
         if "*" in id_data:
-            async with self.bot.session.get(
-                f"{self.base_endpoint}/get_all_series"
-            ) as resp:
-                resp.raise_for_status()
-                data: AllSeries = await resp.json()
             star_data = id_data.pop("*")
-            for item in data.values():
-                if item["last_updated"] > last_updated_int:
-                    id_data[item["slug"]] = star_data
-        for slug in id_data.keys():
-            async with self.bot.session.get(
-                f"{self.base_endpoint}/series/{slug}"
-            ) as resp:
-                resp.raise_for_status()
-                data: Series = await resp.json()
-            for chapter_num, chapter in data["chapters"].items():
-                group_pages, group_release_date, group_id = get_preferred_chapter_data(
-                    chapter, data["preferred_sort"]
-                )
-                if group_release_date >= last_updated_int:
-                    embed = Embed(
-                        title=f"New chapter released! {data['title']} Chapter {chapter_num}",
-                        url=f"{self.website_endpoint}/read/manga/{slug}/{chapter_num}",
-                        timestamp=datetime.fromtimestamp(group_release_date),
-                    )
-                    embed.set_image(
-                        url=f"{self.website_endpoint}/media/manga/{slug}/chapters/{chapter['folder']}/{group_id}/"
-                        f"{group_pages[0]}"
-                    )
-                    if chapter["title"]:
-                        embed.title += f": {chapter['title']}"
-                    for item in id_data[slug]:
-                        updates.append(
-                            UpdateEntry(
-                                item,
-                                f"{data['title']} Chapter {chapter_num}",
-                                embed=embed,
-                            )
-                        )
+            for slug, updated in series_updated.items():
+                if updated >= last_updated_int:
+                    id_data[slug] = [*id_data.get(slug, ()), *star_data]
+        # Series missing from the listing are fetched anyway rather than silently skipped.
+        slugs = [
+            slug
+            for slug in id_data.keys()
+            if series_updated.get(slug, last_updated_int) >= last_updated_int
+        ]
+        # The host limiter bounds how many of these run at once.
+        all_series: List[Series] = await gather(
+            *[self.get_json(f"{self.base_endpoint}/series/{slug}") for slug in slugs]
+        )
+        current_span().set(series_listed=len(series_updated), series_fetched=len(slugs))
+        updates = []
+        for slug, data in zip(slugs, all_series):
+            updates.extend(
+                self.series_updates(slug, data, last_updated_int, id_data[slug])
+            )
         return updates
@@ -1,9 +1,18 @@
+import logging
+import pickle
 import re
-from asyncio import create_task, gather
+from asyncio import Future, Queue, create_task, gather, get_running_loop, sleep
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from copy import deepcopy
 from datetime import datetime, timedelta
 from itertools import chain
 from json import dumps, loads
+from math import ceil
+from multiprocessing import get_context
+from os import getenv
+from time import time
 from typing import (
     Any,
     AsyncGenerator,
@@ -11,21 +20,36 @@ from typing import (
     ClassVar,
     Coroutine,
     Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
     List,
+    NamedTuple,
     Optional,
     Sequence,
+    Set,
+    Tuple,
+    TYPE_CHECKING,
     TypedDict,
 )
 
 from discord import TextStyle
 from discord.ui import TextInput
-from hondana import Chapter, Client, ContentRating, NotFound
+from hondana import APIException, Chapter, Client, ContentRating, NotFound
 from hondana.enums import Order
 from hondana.query import ChapterIncludes, FeedOrderQuery
 
 from .base import BaseModal, BaseSource, UpdateEntry
 from .._patched.types.discord import Interaction
+from ..errors.exceptions import ErrorWithContext
 from ..models import MangaEntry
+from ..tracing import current_span
+from ..utils.general import batch
+
+if TYPE_CHECKING:
+    from ..bot import MangaReleaseBot
+
+logger = logging.getLogger(__name__)
 
 includes = ChapterIncludes()
 order = FeedOrderQuery(created_at=Order.ascending)
@@ -69,6 +93,297 @@ class MangaDexCustomizations(TypedDict, total=True):
     external_links: bool
 
 
+class ChapterFacts(NamedTuple):
+    """A compact summary of a chapter, extracted once per chapter as soon as it is fetched.
+
+    It has what subscription filters look at and what updates show, so the hondana
+    :class:`Chapter` with its manga, tags, authors and groups can be dropped right away. Every
+    update for the chapter shares its :attr:`title` and :attr:`url`.
+    """
+
+    id: str
+    language: Optional[str]
+    external: bool
+    group_ids: FrozenSet[str]
+    uploader_id: Optional[str]
+    manga_id: Optional[str]
+    author_ids: FrozenSet[str]
+    content_rating: Optional[str]
+    tag_ids: FrozenSet[str]
+    #: The thread title for the chapter.
+    title: str
+    url: str
+
+    @classmethod
+    def from_chapter(cls, chapter: Chapter) -> "ChapterFacts":
+        manga = chapter.manga
+        if manga:
+            rating = manga.content_rating
+            manga_id = manga.id
+            author_ids = frozenset(
+                item.id for item in (*(manga.authors or ()), *(manga.artists or ()))
+            )
+            tag_ids = frozenset(tag.id for tag in manga.tags or ())
+        else:
+            rating = manga_id = None
+            author_ids = tag_ids = frozenset()
+        title = manga.title if manga else ""
+        suffix = f" Chapter {chapter.chapter or chapter.title or 'Oneshot'}"
+        suffix_len = len(suffix)
+        if len(title) + suffix_len > 100:  # Max thread title length is 100.
+            max_len = 100 - suffix_len
+            title = title[: max_len - 1] + "…"
+        return cls(
+            id=chapter.id,
+            language=chapter.translated_language,
+            external=bool(chapter.external_url),
+            group_ids=frozenset(group.id for group in chapter.scanlator_groups or ()),
+            uploader_id=chapter.uploader.id if chapter.uploader else None,
+            manga_id=manga_id,
+            author_ids=author_ids,
+            content_rating=getattr(rating, "value", rating),
+            tag_ids=tag_ids,
+            title=title + suffix,
+            url=chapter.url,
+        )
+
+    def resource_keys(self) -> Iterator[str]:
+        """Yield the subscription keys (``resource_type:resource_id``) this chapter belongs to."""
+        yield "*"
+        if self.manga_id:
+            yield f"manga:{self.manga_id}"
+            for author_id in self.author_ids:
+                yield f"author:{author_id}"
+        if self.uploader_id:
+            yield f"user:{self.uploader_id}"
+        for group_id in self.group_ids:
+            yield f"group:{group_id}"
+
+
+def _optional_set(values: Optional[List[str]]) -> Optional[FrozenSet[str]]:
+    return frozenset(values) if values else None
+
+
+class CompiledFilter:
+    """A precompiled form of an entry's :class:`MangaDexCustomizations`.
+
+    Empty lists are stored as ``None`` so that every check is a single ``is None`` test or
+    a frozenset lookup.
+    """
+
+    __slots__ = (
+        "entry_id",
+        "item_id",
+        "source_config",
+        "accept_all",
+        "external_links",
+        "languages",
+        "whitelisted_groups",
+        "whitelist_no_group",
+        "blacklisted_groups",
+        "blacklist_no_group",
+        "whitelisted_users",
+        "blacklisted_users",
+        "whitelisted_content_ratings",
+        "blacklisted_content_ratings",
+        "whitelisted_tags",
+        "blacklisted_tags",
+        "whitelisted_mangas",
+        "blacklisted_mangas",
+    )
+
+    def __init__(self, entry: MangaEntry):
+        customizations: Optional[MangaDexCustomizations] = entry.extra_config
+        self.entry_id: int = entry.id
+        self.item_id: str = entry.item_id
+        self.source_config = deepcopy(customizations)
+        self.accept_all = not customizations
+        if self.accept_all:
+            return
+        resource_type, sep, resource_id = entry.item_id.partition(":")
+        self.external_links: bool = customizations["external_links"]
+        languages = customizations["languages"]
+        self.languages = None if "*" in languages else _optional_set(languages)
+        self.whitelisted_groups = _optional_set(customizations["whitelisted_groups"])
+        self.whitelist_no_group = "no group" in (self.whitelisted_groups or ())
+        self.blacklisted_groups = _optional_set(customizations["blacklisted_groups"])
+        self.blacklist_no_group = "no group" in (self.blacklisted_groups or ())
+        self.whitelisted_users = self.blacklisted_users = None
+        if resource_type != "user":
+            self.whitelisted_users = _optional_set(customizations["whitelisted_users"])
+            self.blacklisted_users = _optional_set(customizations["blacklisted_users"])
+        self.whitelisted_content_ratings = self.blacklisted_content_ratings = None
+        self.whitelisted_tags = self.blacklisted_tags = None
+        self.whitelisted_mangas = self.blacklisted_mangas = None
+        if resource_type != "manga":
+            self.whitelisted_content_ratings = _optional_set(
+                customizations["whitelisted_content_ratings"]
+            )
+            self.blacklisted_content_ratings = _optional_set(
+                customizations["blacklisted_content_ratings"]
+            )
+            self.whitelisted_tags = _optional_set(customizations["whitelisted_tags"])
+            self.blacklisted_tags = _optional_set(customizations["blacklisted_tags"])
+            self.whitelisted_mangas = _optional_set(
+                customizations["whitelisted_mangas"]
+            )
+            self.blacklisted_mangas = _optional_set(
+                customizations["blacklisted_mangas"]
+            )
+
+    def matches(self, facts: ChapterFacts) -> bool:
+        if self.accept_all:
+            return True
+        if facts.external and not self.external_links:
+            return False
+        if self.languages is not None and facts.language not in self.languages:
+            return False
+        if self.whitelisted_groups is not None:
+            if facts.group_ids:
+                if self.whitelisted_groups.isdisjoint(facts.group_ids):
+                    return False
+            elif not self.whitelist_no_group:
+                return False
+        if self.blacklisted_groups is not None:
+            if facts.group_ids:
+                if not self.blacklisted_groups.isdisjoint(facts.group_ids):
+                    return False
+            elif self.blacklist_no_group:
+                return False
+        if (
+            self.whitelisted_users is not None
+            and facts.uploader_id not in self.whitelisted_users
+        ):
+            return False
+        if (
+            self.blacklisted_users is not None
+            and facts.uploader_id in self.blacklisted_users
+        ):
+            return False
+        if (
+            self.whitelisted_content_ratings is not None
+            and facts.content_rating not in self.whitelisted_content_ratings
+        ):
+            return False
+        if (
+            self.blacklisted_content_ratings is not None
+            and facts.content_rating in self.blacklisted_content_ratings
+        ):
+            return False
+        if self.whitelisted_tags is not None and facts.tag_ids:
+            if self.whitelisted_tags.isdisjoint(facts.tag_ids):
+                return False
+        if self.blacklisted_tags is not None and facts.tag_ids:
+            if not self.blacklisted_tags.isdisjoint(facts.tag_ids):
+                return False
+        if (
+            self.whitelisted_mangas is not None
+            and facts.manga_id not in self.whitelisted_mangas
+        ):
+            return False
+        if (
+            self.blacklisted_mangas is not None
+            and facts.manga_id in self.blacklisted_mangas
+        ):
+            return False
+        return True
+
+
+class FilterIndex:
+    """An inverted index over the compiled filters of one subscription key.
+
+    Filters are bucketed by the languages, whitelisted groups and whitelisted content ratings
+    they accept, so a chapter is only fully checked against filters that could accept it.
+    """
+
+    linear_threshold: ClassVar[int] = 8
+
+    def __init__(self, filters: Sequence[CompiledFilter]):
+        self.filters = list(filters)
+        self.by_language: Dict[str, Set[int]] = defaultdict(set)
+        self.any_language: Set[int] = set()
+        self.by_group: Dict[str, Set[int]] = defaultdict(set)
+        self.any_group: Set[int] = set()
+        self.by_rating: Dict[str, Set[int]] = defaultdict(set)
+        self.any_rating: Set[int] = set()
+        for position, compiled in enumerate(self.filters):
+            if compiled.accept_all or compiled.languages is None:
+                self.any_language.add(position)
+            else:
+                for language in compiled.languages:
+                    self.by_language[language].add(position)
+            if compiled.accept_all or compiled.whitelisted_groups is None:
+                self.any_group.add(position)
+            else:
+                for group in compiled.whitelisted_groups:
+                    self.by_group[group].add(position)
+            if compiled.accept_all or compiled.whitelisted_content_ratings is None:
+                self.any_rating.add(position)
+            else:
+                for rating in compiled.whitelisted_content_ratings:
+                    self.by_rating[rating].add(position)
+
+    def candidates(self, facts: ChapterFacts) -> Iterable[int]:
+        if len(self.filters) <= self.linear_threshold:
+            return range(len(self.filters))
+        positions = self.any_language | self.by_language.get(facts.language, set())
+        positions &= self.any_rating | self.by_rating.get(facts.content_rating, set())
+        if positions:
+            groups = self.any_group.union(
+                *(
+                    self.by_group.get(group, ())
+                    for group in facts.group_ids or ("no group",)
+                )
+            )
+            positions &= groups
+        return sorted(positions)
+
+    def match(self, facts: ChapterFacts) -> Iterator[CompiledFilter]:
+        for position in self.candidates(facts):
+            compiled = self.filters[position]
+            if compiled.matches(facts):
+                yield compiled
+
+
+class SubscriptionMatcher:
+    """Matches chapters against every subscription of a tick, keyed like :meth:`ChapterFacts.resource_keys`."""
+
+    def __init__(self, filters: Dict[str, List[CompiledFilter]]):
+        grouped: Dict[str, List[CompiledFilter]] = defaultdict(list)
+        for key, value in filters.items():
+            resource_type, sep, resource_id = key.partition(":")
+            grouped["*" if resource_id == "*" else key].extend(value)
+        self.indexes = {key: FilterIndex(value) for key, value in grouped.items()}
+
+    def match(self, facts: ChapterFacts) -> Iterator[CompiledFilter]:
+        for key in facts.resource_keys():
+            index = self.indexes.get(key)
+            if index is not None:
+                yield from index.match(facts)
+
+
+#: The matcher last unpickled by this worker process, keyed by its check's token.
+_worker_matcher: Tuple[Optional[int], Optional[SubscriptionMatcher]] = (None, None)
+
+
+def _match_chunk(
+    token: int, matcher_data: bytes, chunk: List[ChapterFacts]
+) -> List[Tuple[int, str]]:
+    """Match a chunk of chapters in a worker process, returning ``(entry_id, chapter_id)`` pairs.
+
+    The matcher is only unpickled for the first chunk of each check a worker gets.
+    """
+    global _worker_matcher
+    if _worker_matcher[0] != token:
+        _worker_matcher = (token, pickle.loads(matcher_data))
+    matcher = _worker_matcher[1]
+    return [
+        (compiled.entry_id, facts.id)
+        for facts in chunk
+        for compiled in matcher.match(facts)
+    ]
+
+
 class MangadexModal(BaseModal):
     def __init__(self, entry: MangaEntry, source: "MangaDex"):
         super().__init__(entry, source)
@@ -97,6 +412,16 @@ class MangaDex(BaseSource):
         r"4}\b-[0-9a-fA-F]{4}\b-[0-9a-fA-F]{12}|\*)"
     )
 
+    prefetch_depth: ClassVar[int] = 3
+    max_page_retries: ClassVar[int] = 4
+    backoff_base: ClassVar[float] = 5
+    targeted_batch_size: ClassVar[int] = 100
+    #: Chapters of a check matched on the event loop before the rest go to the process pool.
+    pool_threshold: ClassVar[int] = 1000
+    pool_chunk_size: ClassVar[int] = 500
+    #: Bump whenever :attr:`default_customizations` gains a key.
+    config_version: ClassVar[int] = 1
+
     default_customizations: ClassVar[MangaDexCustomizations] = {
         "languages": ["en"],
         "whitelisted_groups": [],
@@ -112,9 +437,68 @@ class MangaDex(BaseSource):
         "external_links": False,
     }
 
+    def __init__(self, bot: "MangaReleaseBot"):
+        super().__init__(bot)
+        self.compiled_filters: Dict[int, CompiledFilter] = {}
+        #: How many chapters the global feed had per hour the last time it was walked.
+        self.feed_chapters_per_hour: Optional[float] = None
+        #: Worker processes for matching large backlogs, from ``MATCH_PROCESSES``; 0 matches
+        #: everything on the event loop.
+        self.match_processes = int(getenv("MATCH_PROCESSES", "0"))
+        if self.match_processes < 0:
+            raise ValueError(
+                f"MATCH_PROCESSES has to be 0 or more, not {self.match_processes}"
+            )
+        self.match_pool: Optional[ProcessPoolExecutor] = None
+        self.match_checks = 0
+
     async def customize(self, entry: MangaEntry) -> MangadexModal:
         return MangadexModal(entry, self)
 
+    def compile(self, entry: MangaEntry) -> CompiledFilter:
+        """Get the compiled filter for an entry, compiling it if it is not cached or is stale."""
+        compiled = self.compiled_filters.get(entry.id)
+        if (
+            compiled is None
+            or compiled.item_id != entry.item_id
+            or compiled.source_config != entry.extra_config
+        ):
+            compiled = self.compiled_filters[entry.id] = CompiledFilter(entry)
+        return compiled
+
+    def adaptive_item(self, item_id: str) -> bool:
+        return item_id.startswith("manga:")
+
+    def invalidate(self, entry: MangaEntry):
+        self.compiled_filters.pop(entry.id, None)
+
+    def can_skip_items(self, item_ids: Iterable[str], last_update: datetime) -> bool:
+        return self.plan_queries(item_ids, last_update) is not None
+
+    def match_in_pool(
+        self, token: int, matcher_data: bytes, chunk: List[ChapterFacts]
+    ) -> "Future[List[Tuple[int, str]]]":
+        if self.match_pool is None:
+            # Forking a process with a running event loop and its threads is not safe.
+            self.match_pool = ProcessPoolExecutor(
+                self.match_processes, mp_context=get_context("spawn")
+            )
+        loop = get_running_loop()
+        try:
+            return loop.run_in_executor(
+                self.match_pool, _match_chunk, token, matcher_data, chunk
+            )
+        except BrokenProcessPool as e:
+            # Raised when the chunks are awaited, so every chunk falls back the same way.
+            future = loop.create_future()
+            future.set_exception(e)
+            return future
+
+    def close(self):
+        if self.match_pool is not None:
+            self.match_pool.shutdown(wait=False, cancel_futures=True)
+            self.match_pool = None
+
     async def get_id(self, url: str) -> Optional[str]:
         match = self.url_regex.match(url)
         if not match:
@@ -132,6 +516,10 @@ class MangaDex(BaseSource):
         return f"{resource_type}:{resource_id}"
 
     def filter_chapter_entry(self, chapter: Chapter, entry: MangaEntry) -> bool:
+        """Reference implementation of the chapter filter.
+
+        :meth:`check_updates` uses the equivalent :class:`CompiledFilter` instead.
+        """
         customizations: Optional[MangaDexCustomizations] = entry.extra_config
         if not customizations:
             return True
@@ -146,7 +534,7 @@ class MangaDex(BaseSource):
         if customizations["whitelisted_groups"]:
             if chapter.scanlator_groups:
                 for group in chapter.scanlator_groups:
-                    if group in customizations["whitelisted_groups"]:
+                    if group.id in customizations["whitelisted_groups"]:
                         break
                 else:
                     return False
@@ -174,23 +562,25 @@ class MangaDex(BaseSource):
             ):
                 return False
         if resource_type != "manga":
+            content_rating = getattr(
+                chapter.manga.content_rating, "value", chapter.manga.content_rating
+            )
             if (
                 customizations["whitelisted_content_ratings"]
-                and chapter.manga.content_rating
-                not in customizations["whitelisted_content_ratings"]
+                and content_rating not in customizations["whitelisted_content_ratings"]
             ):
                 return False
             if (
                 customizations["blacklisted_content_ratings"]
-                and chapter.manga.content_rating
-                in customizations["blacklisted_content_ratings"]
+                and content_rating in customizations["blacklisted_content_ratings"]
             ):
                 return False
             if customizations["whitelisted_tags"] and chapter.manga.tags:
                 for tag in chapter.manga.tags:
                     if tag.id in customizations["whitelisted_tags"]:
-                        pass
-                return False
+                        break
+                else:
+                    return False
             if customizations["blacklisted_tags"] and chapter.manga.tags:
                 for tag in chapter.manga.tags:
                     if tag.id in customizations["blacklisted_tags"]:
@@ -203,92 +593,277 @@ class MangaDex(BaseSource):
                     return False
         return True
 
-    async def all_chapters(
+    async def chapter_page(
         self, start_time: Optional[datetime], **kwargs
-    ) -> AsyncGenerator[Chapter, None]:
-        while True:
-            data = await self.bot.hondana.chapter_list(
-                **kwargs,
-                limit=100,
-                order=order,
-                includes=includes,
-                include_future_updates=False,
-                content_rating=content_ratings,
-                created_at_since=start_time,
-            )
-            for item in data.items:
-                yield item
-            if len(data.items) == 0:
-                return
+    ) -> List[Chapter]:
+        """Fetch one page of the chapter feed, backing off when MangaDex keeps failing.
+
+        hondana already retries rate limits and server errors a few times per request; this
+        only kicks in once it gives up, and honors the ``x-ratelimit-retry-after`` header.
+        """
+        for attempt in range(self.max_page_retries + 1):
+            try:
+                with self.bot.metrics.time(
+                    "source_request_seconds", source=self.source_name
+                ), self.bot.tracer.span(
+                    "mangadex.chapter_page", attempt=attempt
+                ) as span:
+                    data = await self.bot.hondana.chapter_list(
+                        **kwargs,
+                        limit=100,
+                        order=order,
+                        includes=includes,
+                        include_future_updates=False,
+                        content_rating=content_ratings,
+                        created_at_since=start_time,
+                    )
+                    span.set(chapters=len(data.items))
+            except APIException as e:
+                if (
+                    e.status_code != 429 and e.status_code < 500
+                ) or attempt == self.max_page_retries:
+                    raise
+                delay = self.backoff_base * 2**attempt
+                retry_after = e.response.headers.get("x-ratelimit-retry-after")
+                if retry_after is not None:
+                    delay = max(delay, int(retry_after) - time() + 1)
+                logger.warning(
+                    "MangaDex returned %s, retrying chapter page in %.1f seconds",
+                    e.status_code,
+                    delay,
+                )
+                await sleep(delay)
             else:
-                start_time = data.items[-1].created_at + timedelta(seconds=1)
+                return data.items
+
+    async def prefetch_chapter_pages(
+        self, start_time: Optional[datetime], queue: Queue, **kwargs
+    ):
+        """Keep fetching chapter pages into the queue until a partial page is found.
+
+        Pages are queued as :class:`ChapterFacts`, so full chapters are not held while they wait.
+        """
+        try:
+            while True:
+                items = await self.chapter_page(start_time, **kwargs)
+                await queue.put([ChapterFacts.from_chapter(item) for item in items])
+                if len(items) == 0:
+                    return
+                if len(items) < 100:  # A partial page is the last one.
+                    await queue.put([])
+                    return
+                start_time = items[-1].created_at + timedelta(seconds=1)
+        except Exception as e:
+            await queue.put(e)
 
-    async def migrate(self, entry: MangaEntry):
+    async def all_chapters(
+        self, start_time: Optional[datetime], depth: Optional[int] = None, **kwargs
+    ) -> AsyncGenerator[ChapterFacts, None]:
+        """Iterate over the chapter feed, fetching up to ``depth`` pages ahead of the consumer."""
+        queue: Queue = Queue(maxsize=depth or self.prefetch_depth)
+        fetcher = create_task(self.prefetch_chapter_pages(start_time, queue, **kwargs))
+        try:
+            while True:
+                items = await queue.get()
+                if isinstance(items, Exception):
+                    raise items
+                if len(items) == 0:
+                    return
+                for item in items:
+                    yield item
+        finally:
+            fetcher.cancel()
+
+    async def validate(self, entry: MangaEntry, config: Any):
+        if config is None or config == {}:
+            return  # Skipped or reset to the defaults.
+        if not isinstance(config, dict):
+            raise ErrorWithContext(6, "The config has to be a JSON object.")
+        for key, value in self.default_customizations.items():
+            config.setdefault(key, deepcopy(value))
+
+    def migrate(self, entry: MangaEntry) -> bool:
+        """Add any keys missing from the entry's config. Return whether it changed."""
         config = entry.extra_config or {}
         default = self.default_customizations
-        existing_keys = set(config.keys())
-        default_keys = set(default.keys())
-        if existing_keys != default_keys:
-            for key in default_keys - existing_keys:
-                config[key] = default[key]
-            entry.extra_config = config
-            await entry.save()
+        missing = default.keys() - config.keys()
+        if not missing:
+            return False
+        for key in missing:
+            config[key] = deepcopy(default[key])
+        entry.extra_config = config
+        self.invalidate(entry)
+        return True
+
+    async def upgrade_configs(self):
+        """Migrate the configs of every entry once per :attr:`config_version`.
+
+        The version that was last applied is kept in the ``mangadex_config_version`` config
+        key, so update checks can assume every config has all the keys.
+        """
+        config_manager = self.bot.config_manager
+        if getattr(config_manager, "mangadex_config_version", 0) >= self.config_version:
+            return
+        entries = await MangaEntry.filter(source_id=type(self).__name__)
+        changed = [entry for entry in entries if self.migrate(entry)]
+        if changed:
+            await MangaEntry.bulk_update(changed, ["extra_config"], batch_size=500)
+        logger.info(
+            "Migrated the configs of %s of %s MangaDex entries to version %s",
+            len(changed),
+            len(entries),
+            self.config_version,
+        )
+        config_manager.mangadex_config_version = self.config_version
+        await config_manager.save()
+
+    def plan_queries(
+        self, keys: Iterable[str], last_update: datetime
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Plan filtered chapter feed queries for the subscribed items.
+
+        :return: The keyword arguments for each :meth:`all_chapters` call, or None if the
+            global feed has to be used or is expected to be cheaper.
+        """
+        ids: Dict[str, List[str]] = defaultdict(list)
+        for key in keys:
+            resource_type, sep, resource_id = key.partition(":")
+            if resource_id == "*" or resource_type not in ("manga", "group", "user"):
+                # There is no feed filter for authors, and wildcards need everything.
+                logger.debug("Using the global chapter feed because of %s", key)
+                return None
+            ids[resource_type].append(resource_id)
+        queries: List[Dict[str, Any]] = [
+            {"manga": manga_id} for manga_id in ids["manga"]
+        ]
+        queries.extend(
+            {"groups": group_ids}
+            for group_ids in batch(ids["group"], self.targeted_batch_size)
+        )
+        queries.extend(
+            {"uploader": user_ids}
+            for user_ids in batch(ids["user"], self.targeted_batch_size)
+        )
+        if self.feed_chapters_per_hour is None:
+            global_cost = None
+        else:
+            hours = (
+                datetime.now(last_update.tzinfo) - last_update
+            ).total_seconds() / 3600
+            global_cost = ceil(self.feed_chapters_per_hour * hours / 100) or 1
+        logger.debug(
+            "Chapter feed plan: %s targeted queries (at least one request each) or an "
+            "estimated %s global feed requests",
+            len(queries),
+            global_cost,
+        )
+        if global_cost is None or len(queries) >= global_cost:
+            return None
+        return queries
+
+    async def global_chapters(
+        self, last_update: datetime
+    ) -> AsyncGenerator[ChapterFacts, None]:
+        """Iterate over the global chapter feed, keeping track of how busy it is."""
+        count = 0
+        async for chapter in self.all_chapters(last_update):
+            count += 1
+            yield chapter
+        hours = (datetime.now(last_update.tzinfo) - last_update).total_seconds() / 3600
+        if hours > 0:
+            self.feed_chapters_per_hour = count / hours
+
+    async def targeted_chapters(
+        self, last_update: datetime, queries: List[Dict[str, Any]]
+    ) -> AsyncGenerator[ChapterFacts, None]:
+        """Iterate over filtered chapter feeds, skipping chapters seen in an earlier query."""
+        seen: Set[str] = set()
+        for query in queries:
+            async for chapter in self.all_chapters(last_update, **query):
+                if chapter.id not in seen:
+                    seen.add(chapter.id)
+                    yield chapter
 
     async def check_updates(
         self, last_update: datetime, data: Dict[str, Sequence[MangaEntry]]
     ) -> List[UpdateEntry]:
-        resource_types: Dict[str, Dict[str, Sequence[MangaEntry]]] = defaultdict(
-            lambda: defaultdict(list)
+        flat_list = list(chain.from_iterable(data.values()))
+        by_id = {entry.id: entry for entry in flat_list}
+        matcher = SubscriptionMatcher(
+            {
+                key: [self.compile(entry) for entry in value]
+                for key, value in data.items()
+            }
         )
-        flat_list = chain.from_iterable(data.values())
-        await gather(*[create_task(self.migrate(entry)) for entry in flat_list])
+        queries = self.plan_queries(data.keys(), last_update)
+        if queries is None:
+            chapters = self.global_chapters(last_update)
+        else:
+            chapters = self.targeted_chapters(last_update, queries)
         entries = []
-        for key, value in data.items():
-            resource_type, sep, resource_id = key.partition(":")
-            if resource_id == "*":
-                resource_type = "*"
-            resource_types[resource_type][resource_id] = value
-        async for chapter in self.all_chapters(last_update):
-            title = chapter.manga.title
-            suffix = f" Chapter {chapter.chapter or chapter.title or 'Oneshot'}"
-            suffix_len = len(suffix)
-            if len(title) + suffix_len > 100:  # Max thread title length is 100.
-                max_len = 100 - suffix_len
-                title = title[: max_len - 1] + "…"
-            title += suffix
-            if "*" in resource_types:
-                for entry in resource_types["*"]["*"]:
-                    if self.filter_chapter_entry(chapter, entry):
-                        entries.append(UpdateEntry(entry, title, message=chapter.url))
-            if chapter.manga:
-                if "manga" in resource_types:
-                    for entry in resource_types["manga"][chapter.manga.id]:
-                        if self.filter_chapter_entry(chapter, entry):
-                            entries.append(
-                                UpdateEntry(entry, title, message=chapter.url)
-                            )
-                if "author" in resource_types and (
-                    *chapter.manga.authors,
-                    *chapter.manga.artists,
-                ):
-                    for author in set(
-                        item.id
-                        for item in (*chapter.manga.authors, *chapter.manga.artists)
-                    ):
-                        for entry in resource_types["author"][author]:
-                            if self.filter_chapter_entry(chapter, entry):
-                                entries.append(
-                                    UpdateEntry(entry, title, message=chapter.url)
-                                )
-            if "user" in resource_types and chapter.uploader:
-                for entry in resource_types["user"][chapter.uploader.id]:
-                    if self.filter_chapter_entry(chapter, entry):
-                        entries.append(UpdateEntry(entry, title, message=chapter.url))
-            if "group" in resource_types and chapter.scanlator_groups:
-                for group in chapter.scanlator_groups:
-                    for entry in resource_types["group"][group.id]:
-                        if self.filter_chapter_entry(chapter, entry):
-                            entries.append(
-                                UpdateEntry(entry, title, message=chapter.url)
-                            )
+        span = current_span()
+        scanned = 0
+        # Past pool_threshold chapters, chapters are matched in chunks in worker processes.
+        matcher_data: Optional[bytes] = None
+        token = 0
+        chunk: List[ChapterFacts] = []
+        chunks: List[Future] = []
+        pooled: Dict[str, ChapterFacts] = {}
+        async for facts in chapters:
+            span.add("chapters_scanned")
+            scanned += 1
+            if self.match_processes and scanned > self.pool_threshold:
+                if matcher_data is None:
+                    # Large matchers take long enough to pickle to stall the event loop.
+                    matcher_data = await get_running_loop().run_in_executor(
+                        None, pickle.dumps, matcher
+                    )
+                    self.match_checks += 1
+                    token = self.match_checks
+                pooled[facts.id] = facts
+                chunk.append(facts)
+                if len(chunk) >= self.pool_chunk_size:
+                    chunks.append(self.match_in_pool(token, matcher_data, chunk))
+                    chunk = []
+                continue
+            for compiled in matcher.match(facts):
+                entries.append(
+                    UpdateEntry(
+                        by_id[compiled.entry_id],
+                        facts.title,
+                        message=facts.url,
+                        chapter_id=facts.id,
+                    )
+                )
+        if chunk:
+            chunks.append(self.match_in_pool(token, matcher_data, chunk))
+        span.set(pool_chunks=len(chunks))
+        try:
+            # Await every chunk so a failing one does not leave the others unretrieved.
+            results = await gather(*chunks)
+        except BrokenProcessPool:
+            # A worker died, e.g. killed for running out of memory. The next check starts a new pool.
+            logger.warning(
+                "The match pool broke, matching %s chapters in this process", len(pooled)
+            )
+            self.close()
+            results = [
+                [
+                    (compiled.entry_id, facts.id)
+                    for facts in pooled.values()
+                    for compiled in matcher.match(facts)
+                ]
+            ]
+        for matches in results:
+            for entry_id, chapter_id in matches:
+                facts = pooled[chapter_id]
+                entries.append(
+                    UpdateEntry(
+                        by_id[entry_id],
+                        facts.title,
+                        message=facts.url,
+                        chapter_id=chapter_id,
+                    )
+                )
+        span.set(updates_matched=len(entries))
         return entries
@@ -0,0 +1,105 @@
+"""An in-memory index of the active manga entries, kept in sync with database writes."""
+import logging
+from collections import defaultdict
+from typing import DefaultDict, Dict, Iterator, List, Optional, Set, Union
+
+from .models import MangaEntry
+
+logger = logging.getLogger(__name__)
+
+
+class SubscriptionIndex:
+    """Index of active (not deleted and not paused) entries with their pings prefetched.
+
+    Anything that changes an entry or its pings should call :meth:`refresh` afterwards.
+    :meth:`load` rebuilds the whole index and is used to reconcile any drift.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.entries: Dict[int, MangaEntry] = {}
+        self.by_source: DefaultDict[str, DefaultDict[str, Dict[int, MangaEntry]]] = (
+            defaultdict(lambda: defaultdict(dict))
+        )
+        self.by_channel: DefaultDict[int, Dict[int, MangaEntry]] = defaultdict(dict)
+        self.by_guild: DefaultDict[int, Set[int]] = defaultdict(set)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self) -> Iterator[MangaEntry]:
+        return iter(self.entries.values())
+
+    def get(self, entry_id: int) -> Optional[MangaEntry]:
+        return self.entries.get(entry_id)
+
+    def add(self, entry: MangaEntry):
+        """Index an entry, or drop it from the index if it is no longer active."""
+        self.remove(entry.id)
+        if entry.deleted or entry.paused:
+            return
+        self.entries[entry.id] = entry
+        self.by_source[entry.source_id][entry.item_id][entry.id] = entry
+        self.by_channel[entry.channel_id][entry.id] = entry
+        self.by_guild[entry.guild_id].add(entry.channel_id)
+
+    def remove(self, entry_id: int):
+        entry = self.entries.pop(entry_id, None)
+        if entry is None:
+            return
+        by_item_id = self.by_source[entry.source_id]
+        del by_item_id[entry.item_id][entry_id]
+        if not by_item_id[entry.item_id]:
+            del by_item_id[entry.item_id]
+        del self.by_channel[entry.channel_id][entry_id]
+        if not self.by_channel[entry.channel_id]:
+            del self.by_channel[entry.channel_id]
+            self.by_guild[entry.guild_id].discard(entry.channel_id)
+
+    async def refresh(self, entry_id: Union[int, str]):
+        """Reload a single entry and its pings from the database."""
+        entry_id = int(entry_id)
+        entry = await MangaEntry.get_or_none(id=entry_id).prefetch_related("pings")
+        if entry is None:
+            self.remove(entry_id)
+        else:
+            self.add(entry)
+
+    async def load(self) -> int:
+        """Rebuild the index from the database.
+
+        :return: The number of entries that were added, removed or changed compared to the
+            previous index.
+        :rtype: int
+        """
+        items = await MangaEntry.filter(deleted=None, paused=None).prefetch_related(
+            "pings"
+        )
+        previous = self.entries
+        self.clear()
+        drift = 0
+        for item in items:
+            old = previous.pop(item.id, None)
+            if old is None or self.signature(old) != self.signature(item):
+                drift += 1
+            self.add(item)
+        drift += len(previous)
+        logger.debug("Loaded %s subscriptions (%s drifted)", len(self), drift)
+        return drift
+
+    @staticmethod
+    def signature(entry: MangaEntry) -> tuple:
+        return (
+            entry.source_id,
+            entry.item_id,
+            entry.channel_id,
+            entry.extra_config,
+            entry.message_channel_first,
+            entry.private_thread,
+            sorted((ping.mention_id, ping.is_role) for ping in entry.pings),
+        )
+
+    def channel_entries(self, channel_id: int) -> List[MangaEntry]:
+        return list(self.by_channel.get(channel_id, {}).values())
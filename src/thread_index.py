@@ -0,0 +1,92 @@
+"""An index of the bot's active threads for picking which ones to archive."""
+from collections import defaultdict
+from datetime import datetime
+from heapq import heapify, heappop, heappush
+from typing import DefaultDict, Dict, List, Tuple, TYPE_CHECKING
+
+from discord import Guild, Thread
+from discord.utils import snowflake_time
+
+if TYPE_CHECKING:
+    from .bot import MangaReleaseBot
+
+HeapItem = Tuple[int, datetime, int]
+
+
+def eviction_key(thread: Thread) -> Tuple[int, datetime]:
+    # If there is no last message, it's probably an old thread, and so we aggressively target these first.
+    # Has to be `or 0` because you cannot compare an int and None.
+    return thread.last_message_id or 0, thread.created_at or snowflake_time(thread.id)
+
+
+class ThreadIndex:
+    """Per-guild index of the active threads owned by the bot.
+
+    Each guild has a heap ordered by :func:`eviction_key`. Keys change as messages are sent,
+    so heap items are checked when popped and pushed back with their current key if stale.
+    Items of removed threads are dropped when popped, or all at once by :meth:`rebuild_heap`
+    once they outnumber the live threads more than :attr:`max_stale_ratio` to one.
+    """
+
+    max_stale_ratio = 2
+
+    def __init__(self, bot: "MangaReleaseBot"):
+        self.bot = bot
+        self.threads: DefaultDict[int, Dict[int, Thread]] = defaultdict(dict)
+        self.heaps: DefaultDict[int, List[HeapItem]] = defaultdict(list)
+
+    def count(self, guild_id: int) -> int:
+        return len(self.threads.get(guild_id, ()))
+
+    def add(self, thread: Thread):
+        if thread.owner_id != self.bot.user.id or thread.archived:
+            self.remove(thread.guild.id, thread.id)
+            return
+        if thread.id not in self.threads[thread.guild.id]:
+            heappush(self.heaps[thread.guild.id], (*eviction_key(thread), thread.id))
+        self.threads[thread.guild.id][thread.id] = thread
+
+    def remove(self, guild_id: int, thread_id: int):
+        threads = self.threads[guild_id]
+        if threads.pop(thread_id, None) is None:
+            return
+        stale = len(self.heaps[guild_id]) - len(threads)
+        if stale > self.max_stale_ratio * len(threads):
+            self.rebuild_heap(guild_id)
+
+    def rebuild_heap(self, guild_id: int):
+        """Rebuild a guild's heap from its live threads, dropping stale items."""
+        heap = [
+            (*eviction_key(thread), thread.id)
+            for thread in self.threads[guild_id].values()
+        ]
+        heapify(heap)
+        self.heaps[guild_id] = heap
+
+    def forget_guild(self, guild_id: int):
+        self.threads.pop(guild_id, None)
+        self.heaps.pop(guild_id, None)
+
+    def load_guild(self, guild: Guild):
+        """Rebuild the index of a guild from discord.py's thread cache."""
+        self.forget_guild(guild.id)
+        for thread in guild.threads:
+            self.add(thread)
+
+    def pop_oldest(self, guild_id: int, count: int) -> List[Thread]:
+        """Remove and return up to ``count`` threads with the lowest eviction keys."""
+        heap = self.heaps[guild_id]
+        threads = self.threads[guild_id]
+        popped = []
+        while heap and len(popped) < count:
+            last_message_id, created_at, thread_id = heappop(heap)
+            thread = threads.get(thread_id)
+            if thread is None:
+                continue
+            key = eviction_key(thread)
+            if key != (last_message_id, created_at):
+                heappush(heap, (*key, thread_id))
+                continue
+            del threads[thread_id]
+            popped.append(thread)
+        return popped
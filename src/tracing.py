@@ -0,0 +1,107 @@
+"""Structured spans for finding out where a slow poll or delivery spent its time."""
+from collections import deque
+from contextvars import ContextVar
+from time import perf_counter, time
+from typing import Any, Deque, Dict, List, Optional, Union
+
+
+class Span:
+    """A timed stage of work. Spans started while another is active become its children."""
+
+    __slots__ = (
+        "name",
+        "attributes",
+        "started",
+        "duration",
+        "children",
+        "start",
+        "token",
+    )
+
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        self.name = name
+        self.attributes = attributes
+        self.started = time()
+        self.duration: Optional[float] = None
+        self.children: List["Span"] = []
+
+    def set(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+    def add(self, key: str, amount: float = 1):
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def __enter__(self) -> "Span":
+        self.start = perf_counter()
+        self.token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = perf_counter() - self.start
+        _current.reset(self.token)
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "started": self.started,
+            "duration": self.duration,
+            "attributes": self.attributes,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
+class NullSpan:
+    """Stands in for a span while tracing is disabled."""
+
+    __slots__ = ()
+
+    def set(self, **attributes: Any):
+        pass
+
+    def add(self, key: str, amount: float = 1):
+        pass
+
+    def __enter__(self) -> "NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+NULL_SPAN = NullSpan()
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Union[Span, NullSpan]:
+    """Get the innermost active span, for adding attributes without a reference to the tracer."""
+    return _current.get() or NULL_SPAN
+
+
+class Tracer:
+    """Records spans, keeping the last ``maxlen`` top-level spans (with their children)."""
+
+    def __init__(self, maxlen: int = 200, enabled: bool = False):
+        self.enabled = enabled
+        self.traces: Deque[Span] = deque(maxlen=maxlen)
+
+    def span(
+        self, name: str, *, root: bool = False, **attributes: Any
+    ) -> Union[Span, NullSpan]:
+        """Start a span. ``root`` keeps it out of the active span, for work that outlives it."""
+        if not self.enabled:
+            return NULL_SPAN
+        span = Span(name, attributes)
+        parent = _current.get()
+        if root or parent is None:
+            self.traces.append(span)
+        else:
+            parent.children.append(span)
+        return span
+
+    def dump(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        traces = list(self.traces)
+        if limit is not None:
+            traces = traces[-limit:]
+        return [span.to_dict() for span in traces]
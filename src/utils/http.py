@@ -0,0 +1,116 @@
+import logging
+from asyncio import Semaphore
+from collections import OrderedDict
+from json import JSONDecodeError, dump, load
+from typing import Any, Dict, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+from aiohttp import ClientSession
+
+from ..tracing import current_span
+
+logger = logging.getLogger(__name__)
+
+
+class HostLimiter:
+    """Limit the number of concurrent requests made to each host."""
+
+    def __init__(self, per_host: int = 5):
+        self.per_host = per_host
+        self.semaphores: Dict[str, Semaphore] = {}
+
+    def limit(self, url: str, per_host: Optional[int] = None) -> Semaphore:
+        """Get the semaphore guarding requests to the host of the URL.
+
+        ``per_host`` sets the limit for the host the first time it is seen.
+        """
+        host = urlsplit(url).netloc
+        if host not in self.semaphores:
+            self.semaphores[host] = Semaphore(per_host or self.per_host)
+        return self.semaphores[host]
+
+
+class CachedResponse(NamedTuple):
+    etag: Optional[str]
+    last_modified: Optional[str]
+    body: Any
+
+
+class ResponseCache:
+    """An LRU cache of JSON responses that revalidates with ``If-None-Match``/``If-Modified-Since``.
+
+    Bodies are stored already decoded, so a ``304 Not Modified`` skips both the download and
+    the JSON parsing. Callers must not mutate the returned objects.
+    """
+
+    def __init__(self, maxsize: int = 512, path: Optional[str] = None):
+        self.maxsize = maxsize
+        self.path = path
+        self.entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self):
+        """Load persisted entries from :attr:`path`, if one was given."""
+        if not self.path:
+            return
+        try:
+            with open(self.path) as file:
+                data = load(file)
+        except FileNotFoundError:
+            return
+        except (OSError, JSONDecodeError) as e:
+            logger.warning("Could not load HTTP cache from %s: %s", self.path, e)
+            return
+        for url, item in data.items():
+            self.store(url, CachedResponse(*item))
+
+    def save(self):
+        """Persist the cached entries to :attr:`path`, if one was given."""
+        if not self.path:
+            return
+        with open(self.path, "w") as file:
+            dump({url: list(item) for url, item in self.entries.items()}, file)
+
+    def store(self, url: str, item: CachedResponse):
+        self.entries[url] = item
+        self.entries.move_to_end(url)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    async def get_json(self, session: ClientSession, url: str) -> Any:
+        """Fetch a JSON document, revalidating a cached copy if there is one.
+
+        :param session: The session to make the request with.
+        :type session: ClientSession
+        :param url: The URL to fetch.
+        :type url: str
+        :raises aiohttp.ClientResponseError: If the response has an error status.
+        :return: The decoded JSON body.
+        :rtype: Any
+        """
+        cached = self.entries.get(url)
+        headers = {}
+        if cached is not None:
+            if cached.etag:
+                headers["If-None-Match"] = cached.etag
+            if cached.last_modified:
+                headers["If-Modified-Since"] = cached.last_modified
+        span = current_span()
+        async with session.get(url, headers=headers) as resp:
+            span.set(status=resp.status)
+            if resp.status == 304 and cached is not None:
+                self.hits += 1
+                self.entries.move_to_end(url)
+                return cached.body
+            resp.raise_for_status()
+            span.set(bytes=len(await resp.read()))
+            body = await resp.json()
+            etag = resp.headers.get("ETag")
+            last_modified = resp.headers.get("Last-Modified")
+        self.misses += 1
+        if etag or last_modified:
+            self.store(url, CachedResponse(etag, last_modified, body))
+        else:
+            self.entries.pop(url, None)
+        return body
@@ -53,4 +53,6 @@ async def save_config(entry: MangaEntry, config: Any, interaction: Interaction):
         attachment = File(dumps(config), filename=f"customizations-{entry.id}.json")
         await interaction.followup.send(message.rstrip(), file=attachment)
     entry.extra_config = config
+    interaction.client.source_map[entry.source_id].invalidate(entry)
     await entry.save()
+    await interaction.client.subscriptions.refresh(entry.id)